@@ -0,0 +1,12 @@
+"""Stand-alone performance benchmarks.
+
+Each module is a script run from the repository root, e.g.
+``python -m benchmarks.cache_backends``.
+"""
+import os
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
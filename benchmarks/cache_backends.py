@@ -0,0 +1,124 @@
+"""Compare the shared SQLite cache with Django's LocMem and file backends.
+
+    python -m benchmarks.cache_backends [--keys 2000] [--processes 4]
+
+Single-process numbers show the raw cost of each operation.  The
+multi-process run warms the cache in one worker process and then reads
+the same keys from several others: it shows the hit rate workers actually
+get, which is what decides whether a backend is usable behind a
+multi-process WSGI server.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+# roughly the size of a rendered post card
+VALUE = 'x' * 1500
+
+
+def make_backends(workdir):
+    from django.core.cache.backends.filebased import FileBasedCache
+    from django.core.cache.backends.locmem import LocMemCache
+    from yatube.cache import SQLiteCache
+
+    options = {'OPTIONS': {'MAX_ENTRIES': 10 ** 6}}
+    return {
+        'locmem': lambda: LocMemCache('bench', options),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(workdir, 'files'), options),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(workdir, 'cache.sqlite3'), options),
+    }
+
+
+def timed(operation, count):
+    started = time.perf_counter()
+    operation()
+    elapsed = time.perf_counter() - started
+    return count / elapsed if elapsed else float('inf')
+
+
+def run_single(cache, keys):
+    results = {}
+    results['set'] = timed(
+        lambda: [cache.set(key, VALUE) for key in keys], len(keys))
+    results['get'] = timed(
+        lambda: [cache.get(key) for key in keys], len(keys))
+    pages = [keys[i:i + 10] for i in range(0, len(keys), 10)]
+    results['get_many(10)'] = timed(
+        lambda: [cache.get_many(page) for page in pages], len(pages))
+    cache.set('counter', 0)
+    results['incr'] = timed(
+        lambda: [cache.incr('counter') for _ in keys], len(keys))
+    return results
+
+
+def read_in_worker(args):
+    workdir, name, keys = args
+    cache = make_backends(workdir)[name]()
+    started = time.perf_counter()
+    hits = sum(cache.get(key) is not None for key in keys)
+    return hits, time.perf_counter() - started
+
+
+def warm_in_worker(workdir, name, keys):
+    make_backends(workdir)[name]().set_many({key: VALUE for key in keys})
+
+
+def run_shared(workdir, name, keys, processes):
+    context = multiprocessing.get_context('fork')
+    # warm up in a sibling process, like one WSGI worker serving a page
+    # that others then ask for
+    warmer = context.Process(target=warm_in_worker,
+                             args=(workdir, name, keys))
+    warmer.start()
+    warmer.join()
+    with context.Pool(processes) as pool:
+        results = pool.map(read_in_worker,
+                           [(workdir, name, keys)] * processes)
+    hits = sum(hits for hits, _ in results)
+    elapsed = max(elapsed for _, elapsed in results)
+    return hits / (len(keys) * processes), len(keys) * processes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--keys', type=int, default=2000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django()
+    keys = [f'bench:{i}' for i in range(args.keys)]
+    workdir = tempfile.mkdtemp(prefix='yatube-cache-bench-')
+    try:
+        backends = make_backends(workdir)
+        operations = None
+        print('Single process, operations per second')
+        for name, factory in backends.items():
+            results = run_single(factory(), keys)
+            if operations is None:
+                operations = list(results)
+                print(f'{"backend":<12}' + ''.join(
+                    f'{operation:>14}' for operation in operations))
+            print(f'{name:<12}' + ''.join(
+                f'{results[operation]:>14,.0f}' for operation in operations))
+
+        print(f'\n{args.processes} processes reading keys warmed by '
+              f'another process')
+        print(f'{"backend":<12}{"hit rate":>14}{"reads/s":>14}')
+        for name, factory in backends.items():
+            factory().clear()
+            hit_rate, throughput = run_shared(workdir, name, keys,
+                                              args.processes)
+            print(f'{name:<12}{hit_rate:>14.0%}{throughput:>14,.0f}')
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
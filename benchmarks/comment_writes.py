@@ -0,0 +1,117 @@
+"""Comment throughput of many concurrent commenters, with and without the
+writer thread of ``posts.writer``.
+
+    python -m benchmarks.comment_writes [--commenters 32] [--seconds 10]
+
+The commenters are threads of one process, like the request threads of a
+threaded WSGI worker, each posting comments through ``add_comment`` as
+fast as it can.  ``direct`` saves every comment on the request thread's own
+connection (``WRITE_QUEUE = False``), ``queued`` hands them to the writer
+thread.  Both run on copies of the same generated database with the
+settings' SQLite profile.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks.sqlite_concurrency import configure, percentile, populate
+
+
+def run_mode(workdir, mode, commenters, seconds):
+    from yatube import settings
+
+    settings.WRITE_QUEUE = mode == 'queued'
+    name = f'{mode}.sqlite3'
+    shutil.copy(os.path.join(workdir, 'source.sqlite3'),
+                os.path.join(workdir, name))
+    configure(workdir, name, None)
+
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from django.test import Client
+    from django.urls import reverse
+    from posts.models import Post
+
+    users = list(User.objects.order_by('pk')[:commenters])
+    urls = [reverse('add_comment', kwargs={'username': username,
+                                           'post_id': pk})
+            for pk, username in Post.objects.order_by('-pk').values_list(
+                'pk', 'author__username')[:100]]
+    connections.close_all()
+
+    barrier = threading.Barrier(commenters)
+    timings, errors = [], []
+
+    def commenter(user, seed):
+        rng = random.Random(seed)
+        client = Client()
+        client.force_login(user)
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = client.post(rng.choice(urls),
+                                       {'text': 'benchmark comment'})
+                ok = response.status_code == 302
+            except Exception:
+                ok = False
+            if ok:
+                timings.append((time.perf_counter() - started) * 1000)
+            else:
+                errors.append(1)
+        connections.close_all()
+
+    threads = [threading.Thread(target=commenter, args=(user, seed))
+               for seed, user in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'comments/s': round(len(timings) / seconds, 1),
+        'errors': len(errors),
+        'p50 ms': round(percentile(timings, 0.5), 1),
+        'p99 ms': round(percentile(timings, 0.99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--commenters', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--posts', type=int, default=5000,
+                        help='Size of the generated dataset.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='yatube-write-bench-')
+    results = {}
+    try:
+        context = multiprocessing.get_context('spawn')
+        process = context.Process(target=populate,
+                                  args=(workdir, args.posts))
+        process.start()
+        process.join()
+        for mode in ('direct', 'queued'):
+            # a process per mode: settings are fixed once Django starts
+            with context.Pool(1) as pool:
+                results[mode] = pool.apply(run_mode, (
+                    workdir, mode, args.commenters, args.seconds))
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f'{args.commenters} commenters, {args.seconds:g} s')
+    columns = list(results['direct'])
+    print(f'{"mode":<8}' + ''.join(f'{column:>12}' for column in columns))
+    for mode, metrics in results.items():
+        print(f'{mode:<8}' + ''.join(f'{metrics[column]:>12}'
+                                     for column in columns))
+
+
+if __name__ == '__main__':
+    main()
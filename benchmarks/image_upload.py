@@ -0,0 +1,115 @@
+"""Memory and time needed to normalize an uploaded camera photo.
+
+    python -m benchmarks.image_upload [--width 6000] [--height 4000]
+
+Compares ``posts.images.normalize_image`` with the straightforward way of
+reading the upload into memory, decoding it at full size and resizing it.
+Every variant runs in a fresh process: tracemalloc reports the Python-side
+peak (upload bytes, output buffers), the change in peak RSS also covers the
+pixel buffers Pillow allocates outside the Python heap.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+from benchmarks import setup_django
+
+
+def make_photo(path, width, height):
+    from PIL import Image
+
+    # noise compresses badly, like a real photo of a busy scene
+    image = Image.frombytes('RGB', (width, height),
+                            os.urandom(width * height * 3))
+    image.save(path, 'JPEG', quality=90)
+
+
+def open_upload(path):
+    from django.core.files.uploadedfile import TemporaryUploadedFile
+
+    # large uploads reach the form as files on disk, not in memory
+    upload = TemporaryUploadedFile(os.path.basename(path), 'image/jpeg',
+                                   os.path.getsize(path), None)
+    with open(path, 'rb') as source:
+        shutil.copyfileobj(source, upload)
+    return upload
+
+
+def naive(upload):
+    from django.conf import settings
+    from PIL import Image
+
+    upload.seek(0)
+    image = Image.open(BytesIO(upload.read()))
+    image.load()
+    image.thumbnail(settings.POST_IMAGE_MAX_SIZE, Image.LANCZOS)
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=settings.POST_IMAGE_QUALITY)
+    return output.getvalue()
+
+
+def pipeline(upload):
+    from posts.images import normalize_image
+
+    return normalize_image(upload).read()
+
+
+VARIANTS = {'naive': naive, 'normalize_image': pipeline}
+
+
+def measure(args):
+    name, path = args
+    setup_django()
+    upload = open_upload(path)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    started = time.perf_counter()
+    output = VARIANTS[name](upload)
+    elapsed = time.perf_counter() - started
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    upload.close()
+    # ru_maxrss is in KiB on Linux
+    return (elapsed, python_peak, (rss_peak - rss_before) * 1024,
+            len(output))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--width', type=int, default=6000)
+    parser.add_argument('--height', type=int, default=4000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='yatube-image-bench-')
+    try:
+        path = os.path.join(workdir, 'photo.jpg')
+        context = multiprocessing.get_context('spawn')
+        # children inherit the peak RSS of this process, keep it small
+        maker = context.Process(target=make_photo,
+                                args=(path, args.width, args.height))
+        maker.start()
+        maker.join()
+        print(f'{args.width}x{args.height} JPEG, '
+              f'{os.path.getsize(path) / 2 ** 20:.1f} MiB')
+        print(f'{"variant":<18}{"seconds":>10}{"python MiB":>12}'
+              f'{"RSS MiB":>10}{"output KiB":>12}')
+        for name in VARIANTS:
+            with context.Pool(1) as pool:
+                elapsed, python_peak, rss_peak, size = pool.apply(
+                    measure, ((name, path),))
+            print(f'{name:<18}{elapsed:>10.2f}'
+                  f'{python_peak / 2 ** 20:>12.1f}'
+                  f'{rss_peak / 2 ** 20:>10.1f}{size / 2 ** 10:>12.0f}')
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
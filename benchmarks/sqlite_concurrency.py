@@ -0,0 +1,197 @@
+"""Read and write throughput of parallel clients on the stock and tuned SQLite.
+
+    python -m benchmarks.sqlite_concurrency [--clients 8] [--seconds 10]
+                                            [--write-share 0.2]
+
+Every client is a process with its own test client, like a worker of a
+multi-process WSGI server.  Each request is a page read (index, group or
+post page) or, with ``--write-share`` probability, a comment posted
+through ``add_comment``.  Both profiles run on copies of the same
+database filled by ``generate_dataset``:
+
+``stock``
+    ``django.db.backends.sqlite3`` with its defaults: rollback journal,
+    ``synchronous = FULL``, a connection per request.
+``tuned``
+    the ``DATABASES`` of ``yatube/settings.py``: WAL, ``synchronous =
+    NORMAL``, ``busy_timeout``, ``mmap_size``, a larger page cache,
+    immediate transactions and persistent connections.
+
+Failed requests are mostly "database is locked" errors of writers that
+gave up waiting.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from benchmarks import setup_django
+
+STOCK = {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0,
+         'OPTIONS': {}}
+
+
+def configure(workdir, name, profile):
+    from yatube import settings
+
+    settings.DEBUG = False
+    # the request and slow query logs would go to the project directory
+    settings.LOGGING = {'version': 1, 'disable_existing_loggers': False}
+    settings.SLOW_QUERY_SAMPLE_RATE = 0
+    if profile is not None:
+        settings.DATABASES['default'].update(profile)
+    settings.DATABASES['default']['NAME'] = os.path.join(workdir, name)
+    settings.CACHES['default']['LOCATION'] = os.path.join(
+        workdir, f'cache-{name}')
+    settings.MEDIA_ROOT = os.path.join(workdir, 'media')
+    setup_django()
+
+
+def populate(workdir, posts):
+    configure(workdir, 'source.sqlite3', STOCK)
+    from django.core.management import call_command
+    from django.db import connections
+
+    call_command('migrate', verbosity=0)
+    call_command('generate_dataset', posts=posts, comments=posts * 2,
+                 users=max(50, posts // 100), groups=10, image_share=0,
+                 stdout=StringIO())
+    connections.close_all()
+
+
+def percentile(values, share):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def client_loop(workdir, name, profile, seed, seconds, write_share,
+                barrier, results):
+    configure(workdir, name, profile)
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from django.test import Client
+    from django.urls import reverse
+    from posts.models import Post, Group
+
+    rng = random.Random(seed)
+    users = list(User.objects.values_list('pk', flat=True)[:200])
+    posts = list(Post.objects.order_by('-pk').values_list(
+        'pk', 'author__username')[:500])
+    groups = list(Group.objects.values_list('slug', flat=True))
+    client = Client()
+    client.force_login(User.objects.get(pk=rng.choice(users)))
+    connections.close_all()
+
+    def read_url():
+        kind = rng.randrange(3)
+        if kind == 0:
+            return reverse('index')
+        if kind == 1:
+            return reverse('group', args=[rng.choice(groups)])
+        pk, username = rng.choice(posts)
+        return reverse('post', kwargs={'username': username, 'post_id': pk})
+
+    timings = {'read': [], 'write': []}
+    errors = 0
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        write = rng.random() < write_share
+        if write:
+            pk, username = rng.choice(posts)
+            url = reverse('add_comment',
+                          kwargs={'username': username, 'post_id': pk})
+        else:
+            url = read_url()
+        started = time.perf_counter()
+        try:
+            if write:
+                response = client.post(url, {'text': 'benchmark comment'})
+            else:
+                response = client.get(url)
+            ok = response.status_code in (200, 302)
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        if ok:
+            timings['write' if write else 'read'].append(elapsed)
+        else:
+            errors += 1
+    results.put((timings, errors))
+
+
+def run_profile(workdir, name, profile, args):
+    shutil.copy(os.path.join(workdir, 'source.sqlite3'),
+                os.path.join(workdir, name))
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.clients)
+    results = context.Queue()
+    processes = [
+        context.Process(target=client_loop, args=(
+            workdir, name, profile, seed, args.seconds, args.write_share,
+            barrier, results))
+        for seed in range(args.clients)
+    ]
+    for process in processes:
+        process.start()
+    reads, writes, errors = [], [], 0
+    for _ in processes:
+        timings, failed = results.get()
+        reads.extend(timings['read'])
+        writes.extend(timings['write'])
+        errors += failed
+    for process in processes:
+        process.join()
+    return {
+        'reads/s': round(len(reads) / args.seconds, 1),
+        'writes/s': round(len(writes) / args.seconds, 1),
+        'errors': errors,
+        'read p50': round(percentile(reads, 0.5), 1),
+        'read p99': round(percentile(reads, 0.99), 1),
+        'write p50': round(percentile(writes, 0.5), 1),
+        'write p99': round(percentile(writes, 0.99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-share', type=float, default=0.2)
+    parser.add_argument('--posts', type=int, default=5000,
+                        help='Size of the generated dataset.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='yatube-sqlite-bench-')
+    try:
+        context = multiprocessing.get_context('spawn')
+        # settings are fixed once Django starts, populate in its own process
+        process = context.Process(target=populate,
+                                  args=(workdir, args.posts))
+        process.start()
+        process.join()
+        results = {
+            'stock': run_profile(workdir, 'stock.sqlite3', STOCK, args),
+            # None: the settings as they are
+            'tuned': run_profile(workdir, 'tuned.sqlite3', None, args),
+        }
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f'{args.clients} clients, {args.seconds:g} s, '
+          f'{args.write_share:.0%} writes, latencies in ms')
+    columns = list(results['stock'])
+    print(f'{"profile":<8}' + ''.join(f'{column:>11}' for column in columns))
+    for name, metrics in results.items():
+        print(f'{name:<8}' + ''.join(f'{metrics[column]:>11}'
+                                     for column in columns))
+
+
+if __name__ == '__main__':
+    main()
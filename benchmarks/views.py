@@ -0,0 +1,234 @@
+"""Time the main views through the test client at several dataset sizes.
+
+    python -m benchmarks.views [--scales 1000,10000] [--requests 30]
+                               [--update-baseline]
+
+Every scale runs in a fresh process with its own database, filled by
+``generate_dataset`` with that many posts.  For each view it records the
+latency percentiles of ``--requests`` requests, the number of queries and
+the peak Python memory of one request.  Caches are cleared before every
+request, so the numbers show the work the view itself does.
+
+The results are compared with ``benchmarks/baselines/views.json``: more
+queries than the baseline, or median latency and memory more than
+``--tolerance`` above it, are reported and make the script exit with
+status 1.  Latencies
+depend on the machine, refresh the baseline with ``--update-baseline`` on
+the machine that runs the comparison.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from benchmarks import setup_django
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'views.json')
+
+# latency differences below this are noise whatever the tolerance says
+MIN_LATENCY_DELTA_MS = 2
+
+
+def configure(workdir, scale):
+    """Point the settings at a scratch database before Django starts."""
+    from yatube import settings
+
+    settings.DEBUG = False
+    # the request and slow query logs would go to the project directory
+    settings.LOGGING = {'version': 1, 'disable_existing_loggers': False}
+    # EXPLAIN of slow queries would be timed as part of the view
+    settings.SLOW_QUERY_SAMPLE_RATE = 0
+    # queries of the writer thread would not be counted
+    settings.WRITE_QUEUE = False
+    settings.DATABASES['default']['NAME'] = os.path.join(
+        workdir, f'db-{scale}.sqlite3')
+    settings.CACHES['default']['LOCATION'] = os.path.join(
+        workdir, f'cache-{scale}.sqlite3')
+    settings.MEDIA_ROOT = os.path.join(workdir, 'media')
+    setup_django()
+
+
+def populate(scale):
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    call_command('generate_dataset', posts=scale, comments=scale * 2,
+                 users=max(50, scale // 100), groups=10,
+                 follows_per_user=20, stdout=StringIO())
+
+
+def scenarios():
+    """Return (name, method, url factory, data factory) for every view."""
+    from django.contrib.auth.models import User
+    from django.db.models import Count
+    from django.urls import reverse
+    from posts.models import Post, Group
+
+    reader = User.objects.annotate(
+        follows=Count('follower')).order_by('-follows').first()
+    author = User.objects.annotate(
+        total=Count('posts')).order_by('-total').first()
+    group = Group.objects.order_by('pk').first()
+    post = Post.objects.order_by('-comment_count').first()
+    post_kwargs = {'username': post.author.username, 'post_id': post.pk}
+
+    return reader, [
+        ('index', 'get', reverse('index'), None),
+        ('group_posts', 'get', reverse('group', args=[group.slug]), None),
+        ('profile', 'get', reverse('profile', args=[author.username]), None),
+        ('post_view', 'get', reverse('post', kwargs=post_kwargs), None),
+        ('follow_index', 'get', reverse('follow_index'), None),
+        ('post_new', 'post', reverse('post_new'),
+         {'text': 'benchmark post', 'group': group.pk}),
+        ('add_comment', 'post', reverse('add_comment', kwargs=post_kwargs),
+         {'text': 'benchmark comment'}),
+        ('api_posts', 'get', reverse('api_posts'), None),
+        ('api_post', 'get', reverse('api_post', args=[post.pk]), None),
+    ]
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def measure(client, method, url, data, requests):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    def call():
+        cache.clear()
+        response = getattr(client, method)(url, data)
+        assert response.status_code in (200, 302), (url,
+                                                    response.status_code)
+
+    call()  # warm up imports, template loading, connections
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    with CaptureQueriesContext(connection) as captured:
+        call()
+    # read now, the next request clears the log the capture points into
+    queries = len(captured)
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'queries': queries,
+        'peak_kib': round(peak / 1024),
+    }
+
+
+def run_scale(args):
+    workdir, scale, requests = args
+    configure(workdir, scale)
+    populate(scale)
+
+    from django.test import Client
+
+    reader, views = scenarios()
+    client = Client()
+    client.force_login(reader)
+    return {name: measure(client, method, url, data, requests)
+            for name, method, url, data in views}
+
+
+def compare(results, baseline, tolerance):
+    """Return a line per metric that got worse than the baseline."""
+    regressions = []
+    for scale, views in results.items():
+        for view, metrics in views.items():
+            expected = baseline.get(scale, {}).get(view)
+            if expected is None:
+                continue
+            if metrics['queries'] > expected['queries']:
+                regressions.append(
+                    f'{view} @ {scale}: {metrics["queries"]} queries, '
+                    f'baseline {expected["queries"]}')
+            # tail percentiles of a few dozen requests are too noisy to
+            # fail a run on, they are only reported
+            for metric in ('p50_ms', 'peak_kib'):
+                limit = expected[metric] * (1 + tolerance)
+                if metric.endswith('_ms'):
+                    limit = max(limit,
+                                expected[metric] + MIN_LATENCY_DELTA_MS)
+                if metrics[metric] > limit:
+                    regressions.append(
+                        f'{view} @ {scale}: {metric} {metrics[metric]}, '
+                        f'baseline {expected[metric]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scales', default='1000,10000',
+                        help='Comma separated numbers of posts.')
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed relative growth of latency and memory.')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    workdir = tempfile.mkdtemp(prefix='yatube-view-bench-')
+    results = {}
+    try:
+        context = multiprocessing.get_context('spawn')
+        for scale in scales:
+            # a process per scale: settings are fixed once Django starts
+            with context.Pool(1) as pool:
+                results[str(scale)] = pool.apply(
+                    run_scale, ((workdir, scale, args.requests),))
+    finally:
+        shutil.rmtree(workdir)
+
+    columns = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_kib')
+    for scale, views in results.items():
+        print(f'\n{scale} posts')
+        print(f'{"view":<16}' + ''.join(f'{column:>10}'
+                                        for column in columns))
+        for view, metrics in views.items():
+            print(f'{view:<16}' + ''.join(f'{metrics[column]:>10}'
+                                          for column in columns))
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as baseline:
+            json.dump(results, baseline, indent=2, sort_keys=True)
+            baseline.write('\n')
+        print(f'\nBaseline written to {args.baseline}')
+        return
+
+    try:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline),
+                                  args.tolerance)
+    except FileNotFoundError:
+        print(f'\nNo baseline at {args.baseline}, run with '
+              f'--update-baseline to create it')
+        return
+    if regressions:
+        print('\nRegressions against the baseline:')
+        for line in regressions:
+            print(f'  {line}')
+        sys.exit(1)
+    print('\nNo regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,142 @@
+from datetime import datetime
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models.functions import Substr
+from django.utils import timezone
+from django.utils.functional import cached_property
 
+from . import search
 from .models import Post, Group, Follow, Comment
 
 
-class PostAdmin(admin.ModelAdmin):
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never counts more than ``ADMIN_COUNT_LIMIT`` rows.
+
+    Filtered changelists get an exact count up to the limit.  Past it, an
+    unfiltered table is estimated from its primary key range, read from the
+    index in two lookups, and a filtered one is reported as the limit.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        queryset = self.object_list.order_by()
+        count = queryset[:limit + 1].count()
+        if count <= limit:
+            return count
+        if not queryset.query.where:
+            low, high = (_edge(queryset, 'pk'), _edge(queryset, '-pk'))
+            return max(high - low + 1, count)
+        return limit
+
+
+def _edge(queryset, ordering):
+    # a separate query per bound: SQLite only answers a lone MIN() or MAX()
+    # from the index, both in one SELECT scan the table
+    field = ordering.lstrip('-')
+    return queryset.order_by(ordering).values_list(field, flat=True)[0]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists that stay fast on tables with millions of rows."""
+    paginator = EstimatedCountPaginator
+    # skips the second, unfiltered COUNT(*) of the whole table
+    show_full_result_count = False
+    empty_value_display = "-пусто-"
+
+
+class TextPreviewMixin:
+    """Show only the start of ``text`` in the changelist."""
+    text_preview_length = 80
+
+    def get_queryset(self, request):
+        # long texts are cut in the database, not after loading them
+        return super().get_queryset(request).annotate(
+            text_preview=Substr('text', 1, self.text_preview_length + 1))
+
+    def get_list_display(self, request):
+        return [
+            'short_text' if field == 'text' else field
+            for field in super().get_list_display(request)
+        ]
+
+    def short_text(self, obj):
+        text = obj.text_preview
+        if len(text) > self.text_preview_length:
+            text = text[:self.text_preview_length - 1] + '…'
+        return text
+    short_text.short_description = 'Текст'
+
+
+class PubDateDrillDown(admin.SimpleListFilter):
+    """Year, then month drill-down answered by pub_date range lookups.
+
+    Unlike ``date_hierarchy`` it never groups the table by date: the
+    available years come from the first and last publication dates, two
+    index lookups, and every choice filters on an indexed range.
+    """
+    title = 'период'
+    parameter_name = 'period'
+
+    def lookups(self, request, model_admin):
+        posts = Post.objects.all()
+        if not posts.exists():
+            return []
+        first = timezone.localtime(_edge(posts, 'pub_date'))
+        last = timezone.localtime(_edge(posts, '-pub_date'))
+        year = self.value()[:4] if self.value() else None
+        if year and year.isdigit():
+            months = range(1, 13)
+            if int(year) == first.year:
+                months = range(first.month, 13)
+            if int(year) == last.year:
+                months = range(months.start, last.month + 1)
+            return [(year, f'Весь {year} год')] + [
+                (f'{year}-{month:02}', f'{year}-{month:02}')
+                for month in months]
+        return [(str(year), str(year))
+                for year in range(last.year, first.year - 1, -1)]
+
+    def queryset(self, request, queryset):
+        period = self._period()
+        if period is None:
+            return queryset
+        return queryset.filter(pub_date__gte=period[0],
+                               pub_date__lt=period[1])
+
+    def _period(self):
+        try:
+            parts = [int(part) for part in (self.value() or '').split('-')]
+            if len(parts) == 1:
+                start = datetime(parts[0], 1, 1)
+                end = datetime(parts[0] + 1, 1, 1)
+            elif len(parts) == 2:
+                start = datetime(parts[0], parts[1], 1)
+                end = (datetime(parts[0] + 1, 1, 1) if parts[1] == 12
+                       else datetime(parts[0], parts[1] + 1, 1))
+            else:
+                return None
+        except (ValueError, OverflowError):
+            return None
+        return timezone.make_aware(start), timezone.make_aware(end)
+
+
+class PostAdmin(TextPreviewMixin, LargeTableAdmin):
     list_display = ("pk", "text", "pub_date", "author")
     search_fields = ("text",)
-    list_filter = ("pub_date",)
-    empty_value_display = "-пусто-"
+    list_filter = ("pub_date", PubDateDrillDown)
+    list_select_related = ("author",)
+    sortable_by = ("pk", "pub_date")
+    autocomplete_fields = ("author", "group")
+
+    def get_search_results(self, request, queryset, search_term):
+        # the FTS index instead of LIKE '%...%' over every row
+        match = search.match_expression(search_term)
+        if not match:
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(match)), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -16,12 +145,23 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = "-пусто-"
 
 
-class FollowAdmin(admin.ModelAdmin):
-    empty_value_display = "-пусто-"
+class FollowAdmin(LargeTableAdmin):
+    list_display = ("pk", "user", "author")
+    list_select_related = ("user", "author")
+    sortable_by = ("pk",)
+    ordering = ("-pk",)
+    autocomplete_fields = ("user", "author")
 
 
-class CommentAdmin(admin.ModelAdmin):
-    empty_value_display = "-пусто-"
+class CommentAdmin(TextPreviewMixin, LargeTableAdmin):
+    list_display = ("pk", "text", "created", "author", "post_id")
+    list_select_related = ("author",)
+    sortable_by = ("pk",)
+    # Meta.ordering by created would sort the whole table, the pk is
+    # already in insertion order
+    ordering = ("-pk",)
+    autocomplete_fields = ("author",)
+    raw_id_fields = ("post",)
 
 
 admin.site.register(Post, PostAdmin)
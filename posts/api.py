@@ -0,0 +1,166 @@
+"""Read-only JSON API, version 1.
+
+Feeds answer with a page of posts and the URL of the next one::
+
+    {"results": [{"id": 12, "text": "...",
+                  "pub_date": "2020-05-01T12:00:00.123456+00:00",
+                  "author": "leo", "group": "cats", "image": null,
+                  "image_width": null, "image_height": null,
+                  "comment_count": 3}, ...],
+     "next": "/api/v1/posts/?after=MjAyMC0wNS0wMVQxMjowMDowMCswMDowMHwxMg"}
+
+Pages are addressed by ``?after=`` cursors only, so every page costs one
+indexed query.  Rows are read with ``values_list`` and serialized by the C
+JSON encoder straight from tuples: no model instances, templates,
+thumbnails or URL reversing per row.  Public feeds and posts answer
+conditional requests with ETags built like those of the HTML pages.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.encoding import filepath_to_uri
+from django.views.decorators.http import condition, require_safe
+
+from yatube.routers import read_from_replica
+from .feed import feed_etag
+from .models import Post, Group, Comment, TimelineEntry
+from .pagination import cursor_page, decode_cursor, encode_position
+
+User = get_user_model()
+
+POST_FIELDS = ('id', 'text', 'pub_date', 'author', 'group', 'image',
+               'image_width', 'image_height', 'comment_count')
+# columns read for POST_FIELDS, the feed position first: id, pub_date
+POST_COLUMNS = ('id', 'pub_date', 'text', 'author__username', 'group__slug',
+                'image', 'image_width', 'image_height', 'comment_count')
+TIMELINE_COLUMNS = ('post_id', 'pub_date', 'post__text', 'author__username',
+                    'post__group__slug', 'post__image', 'post__image_width',
+                    'post__image_height', 'post__comment_count')
+COMMENT_FIELDS = ('id', 'author', 'text', 'created')
+COMMENT_COLUMNS = ('id', 'created', 'author__username', 'text')
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        json.dumps(data, ensure_ascii=False, separators=(',', ':')),
+        content_type='application/json', status=status)
+
+
+def not_found():
+    return json_response({'detail': 'Not found'}, status=404)
+
+
+def _post_rows(rows):
+    media_url = settings.MEDIA_URL
+    return [
+        dict(zip(POST_FIELDS, (
+            pk, text, pub_date.isoformat(), author, group,
+            media_url + filepath_to_uri(image) if image else None,
+            width, height, comments)))
+        for (pk, pub_date, text, author, group, image, width, height,
+             comments) in rows
+    ]
+
+
+def _comment_rows(rows):
+    return [dict(zip(COMMENT_FIELDS, (pk, author, text, created.isoformat())))
+            for pk, created, author, text in rows]
+
+
+def _next_url(request, rows):
+    """Link past the last row, positioned by its (id, date) columns."""
+    pk, date = rows[-1][:2]
+    return f'{request.path}?after={encode_position(date, pk)}'
+
+
+def _feed_response(request, rows, columns=POST_COLUMNS, id_field='id'):
+    page = cursor_page(rows.values_list(*columns),
+                       after=decode_cursor(request.GET.get('after', '')),
+                       per_page=settings.API_PAGE_SIZE, id_field=id_field)
+    return json_response({
+        'results': _post_rows(page.object_list),
+        'next': _next_url(request, page.object_list)
+        if page.has_next() else None,
+    })
+
+
+def _feed_etag(request, **kwargs):
+    return feed_etag(request, 'api', *kwargs.values())
+
+
+def _post_etag(request, post_id):
+    version = Post.objects.filter(pk=post_id).values_list(
+        'version', flat=True).first()
+    if version is None:
+        return None
+    return feed_etag(request, 'api', post_id, version)
+
+
+@require_safe
+@read_from_replica
+@condition(etag_func=_feed_etag)
+def posts(request):
+    return _feed_response(request, Post.objects.all())
+
+
+@require_safe
+@read_from_replica
+@condition(etag_func=_feed_etag)
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return not_found()
+    return _feed_response(request, Post.objects.filter(group_id=group_id))
+
+
+@require_safe
+@read_from_replica
+@condition(etag_func=_feed_etag)
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return not_found()
+    return _feed_response(request, Post.objects.filter(author_id=author_id))
+
+
+# no ETag: following an author changes the timeline, not the feed
+# generation
+@require_safe
+@read_from_replica
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        return json_response({'detail': 'Authentication required'},
+                             status=403)
+    return _feed_response(
+        request, TimelineEntry.objects.filter(user=request.user),
+        columns=TIMELINE_COLUMNS, id_field='post_id')
+
+
+@require_safe
+@read_from_replica
+@condition(etag_func=_post_etag)
+def post_detail(request, post_id):
+    """A post with a page of its comments, oldest first."""
+    rows = Post.objects.filter(pk=post_id).values_list(*POST_COLUMNS)[:1]
+    if not rows:
+        return not_found()
+    post = _post_rows(rows)[0]
+
+    comments = Comment.objects.filter(post_id=post_id)
+    after = decode_cursor(request.GET.get('after', ''))
+    if after is not None:
+        created, pk = after
+        comments = comments.filter(
+            Q(created__gt=created) | Q(created=created, id__gt=pk))
+    per_page = settings.API_PAGE_SIZE
+    comments = list(comments.order_by('created', 'id').values_list(
+        *COMMENT_COLUMNS)[:per_page + 1])
+    post['comments'] = _comment_rows(comments[:per_page])
+    post['next'] = (_next_url(request, comments[:per_page])
+                    if len(comments) > per_page else None)
+    return json_response(post)
@@ -0,0 +1,59 @@
+"""Helpers for moving rows in bulk, shared by the import and dataset
+commands."""
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+User = get_user_model()
+
+
+def batched(iterable, size):
+    """Yield lists of up to ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def keep_timestamps(model, *field_names):
+    """Let ``bulk_create`` store given values in ``auto_now_add`` fields.
+
+    ``DateTimeField.pre_save`` overwrites such fields with the current time
+    on every insert, bulk or not; the flag is switched off for the duration
+    of the block.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def resolve_users(usernames):
+    """Map ``usernames`` to user ids, creating the missing users.
+
+    New users get an unusable password; they can set one through the
+    password reset flow.
+    """
+    usernames = set(usernames)
+    ids = dict(User.objects.filter(username__in=usernames)
+               .values_list('username', 'pk'))
+    missing = usernames - set(ids)
+    if missing:
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=username, password=password)
+             for username in missing],
+            ignore_conflicts=True)
+        ids.update(User.objects.filter(username__in=missing)
+                   .values_list('username', 'pk'))
+    return ids
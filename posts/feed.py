@@ -0,0 +1,56 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from yatube.routers import replica_generation
+
+FEED_GENERATION_KEY = 'feed_generation'
+
+
+def feed_generation():
+    """Return the current feed generation.
+
+    Cached feed fragments are keyed on it, so bumping the generation makes
+    all of them unreachable at once.  A missing counter (first start,
+    eviction, cache flush) restarts from the current time in milliseconds
+    rather than from zero, so old fragments are never addressed again.
+
+    Views reading from a replica get the generation it was copied at.
+    """
+    generation = replica_generation()
+    if generation is not None:
+        return generation
+    generation = cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        cache.add(FEED_GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(FEED_GENERATION_KEY)
+    return generation
+
+
+def _bump():
+    try:
+        cache.incr(FEED_GENERATION_KEY)
+    except ValueError:
+        feed_generation()
+
+
+def bump_feed_generation():
+    _bump()
+    if transaction.get_connection().in_atomic_block:
+        # pages rendered from the old rows until the commit are cached
+        # under the new generation, retire them once it is done
+        transaction.on_commit(_bump)
+
+
+def feed_etag(request, *parts):
+    """Build an ETag for a public page.
+
+    Everything a feed page shows is covered by the feed generation, the
+    viewer (edit links, navigation) and the query string (page or cursor);
+    ``parts`` adds whatever else the page depends on.
+    """
+    raw = '|'.join(str(part) for part in (
+        feed_generation(), request.user.pk, request.GET.urlencode(), *parts))
+    return hashlib.md5(raw.encode()).hexdigest()
@@ -1,6 +1,10 @@
-from django.forms import ModelForm, Textarea
+from django.core.files.uploadedfile import UploadedFile
+from django.forms import (CharField, Form, ModelChoiceField, ModelForm,
+                          Textarea, ValidationError)
+from PIL import Image
 
-from posts.models import Post, Comment
+from posts.images import normalize_image
+from posts.models import Post, Comment, Group
 
 
 class PostForm(ModelForm):
@@ -18,6 +22,22 @@ class PostForm(ModelForm):
             'image': 'Введите заглавное изображение поста',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                image = normalize_image(image)
+            except (OSError, Image.DecompressionBombError):
+                raise ValidationError('Не удалось обработать изображение')
+            self.instance.image_width = image.width
+            self.instance.image_height = image.height
+            self.instance.image_size = image.size
+        elif not image:
+            self.instance.image_width = None
+            self.instance.image_height = None
+            self.instance.image_size = None
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -26,3 +46,11 @@ class CommentForm(ModelForm):
         widgets = {
             'text': Textarea(attrs={'cols': 80, 'rows': 20}),
         }
+
+
+class SearchForm(Form):
+    q = CharField(label='Поиск', max_length=200, required=False)
+    group = ModelChoiceField(Group.objects.all(), to_field_name='slug',
+                             required=False, label='Группа',
+                             empty_label='Все группы')
+    author = CharField(label='Автор', max_length=150, required=False)
@@ -0,0 +1,63 @@
+"""Upload-time normalization of post images.
+
+Camera originals are downscaled to ``POST_IMAGE_MAX_SIZE``, turned upright,
+stripped of EXIF and other metadata and re-encoded as progressive JPEG
+before they reach ``MEDIA_ROOT``.  Everything downstream (storage, thumbnail
+generation) then works with a file of a predictable, modest size.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+EXIF_ORIENTATION = 0x0112
+# orientations stored sideways: transposing swaps width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class NormalizedImage(ContentFile):
+    """Re-encoded image content along with its pixel size."""
+
+    def __init__(self, content, name, width, height):
+        super().__init__(content, name=name)
+        self.width = width
+        self.height = height
+
+
+def normalize_image(upload):
+    """Return the upload downscaled, upright and re-encoded.
+
+    The upload is read straight from its (possibly on-disk) file.  For
+    JPEG sources ``Image.draft`` lets the decoder scale down by up to 8x
+    while decoding, so a 40 megapixel original never has to be held in
+    memory at full size.
+    """
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        orientation = image.getexif().get(EXIF_ORIENTATION)
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            # the bounds apply to the upright image
+            max_size = max_size[::-1]
+        image.draft('RGB', max_size)
+        image.thumbnail(max_size, Image.LANCZOS)
+        # after the resize: exif_transpose copies the image even when there
+        # is nothing to rotate
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        output = BytesIO()
+        # no exif= argument: nothing from the original metadata is written
+        image.save(output, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+                   optimize=True, progressive=True)
+
+    name = os.path.splitext(os.path.basename(upload.name))[0] + '.jpg'
+    return NormalizedImage(output.getvalue(), name, *image.size)
@@ -0,0 +1,62 @@
+import json
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Post, Group, Comment, Follow
+
+# (record type, queryset, fields) in the order import_jsonl needs them:
+# every row only refers to rows written before it.  Users are referred to
+# by username, everything else by its primary key in the source database.
+EXPORTS = (
+    ('group', Group.objects.all(),
+     ('pk', 'title', 'slug', 'description')),
+    ('post', Post.objects.all(),
+     ('pk', 'text', 'pub_date', 'author__username', 'group', 'image')),
+    ('comment', Comment.objects.all(),
+     ('pk', 'post', 'author__username', 'text', 'created')),
+    ('follow', Follow.objects.all(),
+     ('user__username', 'author__username')),
+)
+
+
+class Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder drops microseconds, which order posts and
+        # comments published within the same millisecond
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class Command(BaseCommand):
+    help = ('Write groups, posts, comments and follows as JSON lines, '
+            'one row per line.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to write, "-" for standard output.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, path, chunk_size, **options):
+        output = sys.stdout if path == '-' else open(path, 'w')
+        try:
+            for kind, queryset, fields in EXPORTS:
+                rows = queryset.order_by('pk').values_list(*fields)
+                count = 0
+                for row in rows.iterator(chunk_size=chunk_size):
+                    record = {'model': kind}
+                    for field, value in zip(fields, row):
+                        record[field.split('__')[0]] = value
+                    output.write(json.dumps(record, cls=Encoder,
+                                            ensure_ascii=False))
+                    output.write('\n')
+                    count += 1
+                self.stderr.write(f'{kind}: {count}')
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,237 @@
+import random
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from posts import timeline
+from posts.bulk import batched, keep_timestamps
+from posts.feed import bump_feed_generation
+from posts.models import Post, Group, Comment, Follow
+
+User = get_user_model()
+
+SYLLABLES = ('ка', 'ла', 'ро', 'ми', 'ту', 'не', 'со', 'ва', 'пе', 'ди',
+             'жи', 'зу', 'бо', 'ры', 'гу', 'ше', 'ли', 'на', 'то', 'ре')
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with a reproducible synthetic dataset: '
+            'long-tailed authorship and follows, comment bursts, images.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='ds',
+                            help='Prefix of generated usernames and slugs.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument(
+            '--author-skew', type=float, default=1.1,
+            help='Zipf exponent of posts per author.')
+        parser.add_argument(
+            '--follows-per-user', type=int, default=20,
+            help='Average number of authors a user follows.')
+        parser.add_argument(
+            '--celebrities', type=int, default=10,
+            help='Number of authors with a large share of all followers.')
+        parser.add_argument(
+            '--celebrity-share', type=float, default=0.3,
+            help='Share of follows that go to celebrities.')
+        parser.add_argument(
+            '--hot-posts', type=float, default=0.01,
+            help='Share of posts that get comment bursts.')
+        parser.add_argument(
+            '--burst-share', type=float, default=0.5,
+            help='Share of comments that go to hot posts.')
+        parser.add_argument(
+            '--image-share', type=float, default=0.1,
+            help='Share of posts with an image.')
+        parser.add_argument('--start-date', default='2019-01-01')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.start = timezone.make_aware(
+            datetime.strptime(options['start_date'], '%Y-%m-%d'))
+        self.span = timedelta(days=options['days'])
+        self.words = self.make_vocabulary(5000)
+        self.word_weights = list(accumulate(
+            1 / rank for rank in range(1, len(self.words) + 1)))
+
+        users = self.create_users()
+        # authors sorted by activity: the first ones write the most posts
+        self.rng.shuffle(users)
+        # celebrities are not necessarily prolific, otherwise fan-out to
+        # their followers would dominate the whole dataset
+        self.celebrities = self.rng.sample(
+            users, min(options['celebrities'], len(users)))
+        self.author_weights = list(accumulate(
+            1 / rank ** options['author_skew']
+            for rank in range(1, len(users) + 1)))
+        groups = self.create_groups()
+        images = self.create_images(8)
+        self.create_follows(users)
+        first_post_pk = self.create_posts(users, groups, images)
+        self.create_comments(users, first_post_pk)
+
+        call_command('repair_counters', batch_size=self.batch_size,
+                     stdout=self.stdout)
+        bump_feed_generation()
+        self.stdout.write(self.style.SUCCESS('Dataset generated'))
+
+    def progress(self, kind, done, total):
+        self.stdout.write(f'{kind}: {done}/{total}')
+
+    def make_vocabulary(self, size):
+        words = set()
+        while len(words) < size:
+            words.add(''.join(self.rng.choice(SYLLABLES)
+                              for _ in range(self.rng.randint(1, 4))))
+        return sorted(words)
+
+    def text(self, low, high):
+        words = self.rng.choices(self.words, cum_weights=self.word_weights,
+                                 k=self.rng.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+    def create_users(self):
+        prefix, count = self.options['prefix'], self.options['users']
+        password = make_password(None)
+        usernames = [f'{prefix}_user_{i}' for i in range(count)]
+        for batch in batched(usernames, self.batch_size):
+            User.objects.bulk_create(
+                [User(username=username, password=password)
+                 for username in batch],
+                ignore_conflicts=True)
+        ids = dict(User.objects.filter(username__startswith=f'{prefix}_user_')
+                   .values_list('username', 'pk'))
+        self.progress('users', len(ids), count)
+        return [ids[username] for username in usernames]
+
+    def create_groups(self):
+        prefix, count = self.options['prefix'], self.options['groups']
+        slugs = [f'{prefix}-{i}' for i in range(count)]
+        Group.objects.bulk_create(
+            [Group(title=f'Сообщество {i}', slug=slug,
+                   description=self.text(5, 20))
+             for i, slug in enumerate(slugs)],
+            ignore_conflicts=True)
+        ids = dict(Group.objects.filter(slug__in=slugs)
+                   .values_list('slug', 'pk'))
+        return [ids[slug] for slug in slugs]
+
+    def create_images(self, count):
+        names = []
+        for i in range(count):
+            name = f'posts/{self.options["prefix"]}_{i}.jpg'
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                # not self.rng: reusing existing files must not change
+                # the rest of the dataset
+                shade = random.Random(i)
+                color = tuple(shade.randrange(256) for _ in range(3))
+                Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+                name = default_storage.save(name,
+                                            ContentFile(buffer.getvalue()))
+            names.append(name)
+        return names
+
+    def create_follows(self, users):
+        """Follow a geometric number of authors, celebrities first."""
+        options = self.options
+        celebrities = self.celebrities
+        average = options['follows_per_user']
+        total = 0
+        for batch in batched(users, max(1, self.batch_size // average)):
+            follows = []
+            for user_id in batch:
+                count = min(int(self.rng.expovariate(1 / average)) + 1,
+                            len(users) - 1)
+                authors = set()
+                while len(authors) < count:
+                    if celebrities and (self.rng.random()
+                                        < options['celebrity_share']):
+                        author_id = self.rng.choice(celebrities)
+                    else:
+                        author_id = self.rng.choice(users)
+                    if author_id != user_id:
+                        authors.add(author_id)
+                follows.extend(Follow(user_id=user_id, author_id=author_id)
+                               for author_id in authors)
+            with transaction.atomic():
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
+            total += len(follows)
+            self.progress('follows', total, f'~{len(users) * average}')
+
+    def post_date(self, index):
+        # posts are spread evenly over the period in primary key order
+        return self.start + self.span * index / self.options['posts']
+
+    def create_posts(self, users, groups, images):
+        options = self.options
+        count = options['posts']
+        first_pk = (Post.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        for start in range(0, count, self.batch_size):
+            indexes = range(start, min(start + self.batch_size, count))
+            authors = self.rng.choices(users, cum_weights=self.author_weights,
+                                       k=len(indexes))
+            posts = []
+            for index, author_id in zip(indexes, authors):
+                image = None
+                if self.rng.random() < options['image_share']:
+                    image = self.rng.choice(images)
+                group_id = None
+                if groups and self.rng.random() < 0.7:
+                    group_id = self.rng.choice(groups)
+                posts.append(Post(
+                    pk=first_pk + index, text=self.text(5, 80),
+                    pub_date=self.post_date(index), author_id=author_id,
+                    group_id=group_id, image=image))
+            with transaction.atomic(), keep_timestamps(Post, 'pub_date'):
+                Post.objects.bulk_create(posts)
+                timeline.fan_out_many(
+                    (post.pk, post.author_id, post.pub_date)
+                    for post in posts)
+            self.progress('posts', indexes.stop, count)
+        return first_pk
+
+    def create_comments(self, users, first_post_pk):
+        """Comment hot posts in bursts and the rest over weeks."""
+        options = self.options
+        count, posts = options['comments'], options['posts']
+        if not posts:
+            return
+        hot_count = max(1, int(posts * options['hot_posts']))
+        hot = self.rng.sample(range(posts), min(hot_count, posts))
+        first_pk = (Comment.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        for start in range(0, count, self.batch_size):
+            comments = []
+            for number in range(start, min(start + self.batch_size, count)):
+                if self.rng.random() < options['burst_share']:
+                    index = self.rng.choice(hot)
+                    delay = timedelta(hours=self.rng.expovariate(1))
+                else:
+                    index = self.rng.randrange(posts)
+                    delay = timedelta(days=self.rng.uniform(0, 30))
+                comments.append(Comment(
+                    pk=first_pk + number, post_id=first_post_pk + index,
+                    author_id=self.rng.choice(users), text=self.text(2, 30),
+                    created=self.post_date(index) + delay))
+            with transaction.atomic(), keep_timestamps(Comment, 'created'):
+                Comment.objects.bulk_create(comments)
+            self.progress('comments', start + len(comments), count)
@@ -0,0 +1,115 @@
+import json
+import sys
+from itertools import groupby
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from posts import timeline
+from posts.bulk import batched, keep_timestamps, resolve_users
+from posts.feed import bump_feed_generation
+from posts.models import Post, Group, Comment, Follow
+
+
+class Command(BaseCommand):
+    help = ('Load a file written by export_jsonl in batched bulk inserts, '
+            'next to the rows already in the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to read, "-" for standard input.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows inserted per transaction.')
+
+    def handle(self, *args, path, batch_size, **options):
+        # Imported posts and comments keep their relative order: their
+        # primary keys are shifted past the ones in use, so references
+        # between them are remapped without keeping a table of ids.
+        self.post_offset = Post.objects.aggregate(top=Max('pk'))['top'] or 0
+        self.comment_offset = (
+            Comment.objects.aggregate(top=Max('pk'))['top'] or 0)
+        # groups are few, they are matched by slug
+        self.group_ids = {}
+        self.batch_size = batch_size
+
+        source = sys.stdin if path == '-' else open(path)
+        try:
+            records = (json.loads(line) for line in source if line.strip())
+            for kind, rows in groupby(records, key=lambda row: row['model']):
+                load = getattr(self, f'load_{kind}', None)
+                if load is None:
+                    raise CommandError(f'Unknown record type {kind!r}')
+                total = 0
+                for batch in batched(rows, batch_size):
+                    with transaction.atomic():
+                        load(batch)
+                    total += len(batch)
+                    self.stdout.write(f'{kind}: {total}')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        # bulk_create sends no signals, bring everything they maintain
+        # up to date
+        call_command('repair_counters', batch_size=batch_size,
+                     stdout=self.stdout)
+        bump_feed_generation()
+        self.stdout.write(self.style.SUCCESS('Import finished'))
+
+    def load_group(self, rows):
+        existing = dict(Group.objects.filter(
+            slug__in=[row['slug'] for row in rows]).values_list('slug', 'pk'))
+        Group.objects.bulk_create(
+            [Group(title=row['title'], slug=row['slug'],
+                   description=row['description'])
+             for row in rows if row['slug'] not in existing],
+            ignore_conflicts=True)
+        existing = dict(Group.objects.filter(
+            slug__in=[row['slug'] for row in rows]).values_list('slug', 'pk'))
+        for row in rows:
+            self.group_ids[row['pk']] = existing[row['slug']]
+
+    def load_post(self, rows):
+        authors = resolve_users(row['author'] for row in rows)
+        posts = [
+            Post(pk=row['pk'] + self.post_offset, text=row['text'],
+                 pub_date=parse_datetime(row['pub_date']),
+                 author_id=authors[row['author']],
+                 group_id=self.group_ids.get(row['group']),
+                 image=row['image'] or None)
+            for row in rows
+        ]
+        with keep_timestamps(Post, 'pub_date'):
+            Post.objects.bulk_create(posts)
+        # only follows already in the database, imported ones are
+        # backfilled when they are loaded
+        timeline.fan_out_many(
+            (post.pk, post.author_id, post.pub_date) for post in posts)
+
+    def load_comment(self, rows):
+        authors = resolve_users(row['author'] for row in rows)
+        comments = [
+            Comment(pk=row['pk'] + self.comment_offset,
+                    post_id=row['post'] + self.post_offset,
+                    author_id=authors[row['author']], text=row['text'],
+                    created=parse_datetime(row['created']))
+            for row in rows
+        ]
+        with keep_timestamps(Comment, 'created'):
+            Comment.objects.bulk_create(comments)
+
+    def load_follow(self, rows):
+        users = resolve_users(
+            username for row in rows for username in (row['user'],
+                                                      row['author']))
+        follows = [
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in rows if row['user'] != row['author']
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        timeline.backfill_many(
+            (follow.user_id, follow.author_id) for follow in follows)
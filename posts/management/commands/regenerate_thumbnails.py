@@ -0,0 +1,149 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from threading import local
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.feed import bump_feed_generation
+from posts.models import Post
+
+GENERATED, SKIPPED, MISSING, FAILED = (
+    'generated', 'skipped', 'missing', 'failed')
+
+
+def forget_connections():
+    """Drop the database connections a worker inherited from the parent.
+
+    The pool forks on the first ``map``, after the parent has queried, and
+    a SQLite handle must not be used on both sides of a fork: the worker
+    opens its own connections instead.  Nothing is closed, the handles
+    still belong to the parent.
+    """
+    connections._connections = local()
+
+
+def regenerate(job):
+    """Make sure the thumbnail of one image exists, return the outcome."""
+    pk, name, force = job
+    try:
+        thumbnail = thumbnails.find_thumbnail(name)
+        if thumbnail is not None and not force and thumbnail.exists():
+            return pk, SKIPPED, None
+        if not default_storage.exists(name):
+            return pk, MISSING, None
+        if thumbnail is not None:
+            # a stale key-value store entry would make sorl return the
+            # missing file instead of generating it
+            if force:
+                thumbnail.delete()
+            default.kvstore.delete(thumbnail, delete_thumbnails=False)
+        thumbnails.create_thumbnail(name)
+        return pk, GENERATED, None
+    except Exception as error:
+        return pk, FAILED, f'{name}: {error}'
+
+
+class Command(BaseCommand):
+    help = 'Generate missing post image thumbnails with a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Number of worker processes, 1 works in this process.')
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Number of images handed to the pool between checkpoints.')
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR,
+                                 'regenerate_thumbnails.checkpoint'),
+            help='File recording progress, so an interrupted run resumes.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore the checkpoint and start from the first post.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate thumbnails that already exist.')
+
+    def handle(self, *args, workers, batch_size, checkpoint, restart, force,
+               **options):
+        last_pk = 0 if restart else self.read_checkpoint(checkpoint)
+        posts = (Post.objects.exclude(image='').exclude(image__isnull=True)
+                 .order_by('pk'))
+        total = posts.filter(pk__gt=last_pk).count()
+        if last_pk:
+            self.stdout.write(f'Resuming after post {last_pk}')
+
+        counts = dict.fromkeys((GENERATED, SKIPPED, MISSING, FAILED), 0)
+        done = 0
+        started = time.perf_counter()
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(workers,
+                                           mp_context=get_context('fork'),
+                                           initializer=forget_connections)
+        try:
+            while True:
+                batch = list(posts.filter(pk__gt=last_pk)
+                             .values_list('pk', 'image')[:batch_size])
+                if not batch:
+                    break
+                jobs = [(pk, name, force) for pk, name in batch]
+                if executor is None:
+                    results = map(regenerate, jobs)
+                else:
+                    results = executor.map(
+                        regenerate, jobs,
+                        chunksize=max(1, len(jobs) // (workers * 4)))
+                generated = []
+                for pk, outcome, error in results:
+                    counts[outcome] += 1
+                    if outcome == GENERATED:
+                        generated.append(pk)
+                    elif error:
+                        self.stderr.write(error)
+                # cached cards still show the placeholder or the old file
+                Post.objects.filter(pk__in=generated).update(
+                    version=F('version') + 1)
+
+                last_pk = batch[-1][0]
+                self.write_checkpoint(checkpoint, last_pk)
+                done += len(batch)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{done}/{total} images, {done / elapsed:.1f}/s, '
+                    + ', '.join(f'{outcome} {count}'
+                                for outcome, count in counts.items()))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if counts[GENERATED]:
+            bump_feed_generation()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {done} images in {time.perf_counter() - started:.1f}s'))
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return json.load(checkpoint)['last_pk']
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, path, last_pk):
+        # replace the file atomically, an interrupted write must not lose
+        # the previous checkpoint
+        with open(path + '.tmp', 'w') as checkpoint:
+            json.dump({'last_pk': last_pk}, checkpoint)
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts import stats
+from posts.models import Post, Comment, AuthorStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized counters and fix the ones that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows checked per transaction.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted counters without saving the fix.')
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        checked, repaired = self.repair_comment_counts(batch_size, dry_run)
+        self.stdout.write(
+            f'Post.comment_count: checked {checked}, repaired {repaired}')
+        checked, repaired = self.repair_author_stats(batch_size, dry_run)
+        self.stdout.write(
+            f'AuthorStats: checked {checked}, repaired {repaired}')
+
+    def repair_comment_counts(self, batch_size, dry_run):
+        checked = repaired = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                    .values_list('pk', 'comment_count')[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                actual = dict(
+                    Comment.objects
+                    .filter(post_id__in=[pk for pk, _ in batch])
+                    .order_by().values('post_id')
+                    .annotate(total=Count('pk'))
+                    .values_list('post_id', 'total'))
+                for pk, stored in batch:
+                    total = actual.get(pk, 0)
+                    if total == stored:
+                        continue
+                    repaired += 1
+                    if not dry_run:
+                        Post.objects.filter(pk=pk).update(
+                            comment_count=total)
+            checked += len(batch)
+        return checked, repaired
+
+    def repair_author_stats(self, batch_size, dry_run):
+        checked = repaired = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    AuthorStats.objects.filter(pk__gt=last_pk).order_by('pk')
+                    .values('pk', *stats.STAT_FIELDS)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1]['pk']
+                actual = stats.count_stats([row['pk'] for row in batch])
+                for row in batch:
+                    user_id = row.pop('pk')
+                    if row == actual[user_id]:
+                        continue
+                    repaired += 1
+                    if not dry_run:
+                        AuthorStats.objects.filter(pk=user_id).update(
+                            **actual[user_id])
+                        stats.forget(user_id)
+            checked += len(batch)
+        return checked, repaired
@@ -0,0 +1,86 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ORDERS = {
+    'total': lambda entry: entry['total_ms'],
+    'count': lambda entry: entry['count'],
+    'max': lambda entry: entry['max_ms'],
+}
+
+
+class Command(BaseCommand):
+    help = ('Aggregate the slow query log written by yatube.profiling by '
+            'query fingerprint, worst first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            help='Log file to read, SLOW_QUERY_LOG by default.')
+        parser.add_argument(
+            '--hours', type=float, default=24,
+            help='Only count queries logged in this many last hours, '
+                 '0 for the whole log.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--order', choices=sorted(ORDERS),
+                            default='total')
+
+    def handle(self, *args, path, hours, limit, order, **options):
+        path = path or settings.SLOW_QUERY_LOG
+        since = None
+        if hours:
+            since = datetime.now(timezone.utc) - timedelta(hours=hours)
+
+        entries = {}
+        skipped = 0
+        try:
+            log = open(path)
+        except FileNotFoundError:
+            raise CommandError(f'No slow query log at {path}')
+        with log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                    logged = datetime.fromisoformat(record['time'])
+                except (ValueError, KeyError):
+                    # a line cut short by a crash or a concurrent writer
+                    skipped += 1
+                    continue
+                if since and logged < since:
+                    continue
+                entry = entries.setdefault(record['fingerprint'], {
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'views': Counter(), 'plan': None,
+                })
+                entry['count'] += 1
+                entry['total_ms'] += record['duration_ms']
+                entry['max_ms'] = max(entry['max_ms'], record['duration_ms'])
+                entry['views'][record['view']] += 1
+                # the latest plan, indexes may have changed since
+                if record['plan']:
+                    entry['plan'] = record['plan']
+
+        count = sum(entry['count'] for entry in entries.values())
+        window = f'in the last {hours:g} hours' if hours else 'in the log'
+        self.stdout.write(f'{count} slow queries, {len(entries)} '
+                          f'fingerprints {window}')
+        if skipped:
+            self.stdout.write(f'{skipped} unreadable lines skipped')
+
+        worst = sorted(entries.items(), key=lambda item: ORDERS[order](
+            item[1]), reverse=True)[:limit]
+        for number, (sql, entry) in enumerate(worst, 1):
+            views = ', '.join(f'{view} ({times})' for view, times
+                              in entry['views'].most_common(3))
+            self.stdout.write(
+                f'\n{number}. {entry["count"]} queries, '
+                f'total {entry["total_ms"]:.1f} ms, '
+                f'mean {entry["total_ms"] / entry["count"]:.1f} ms, '
+                f'max {entry["max_ms"]:.1f} ms')
+            self.stdout.write(f'   views: {views}')
+            self.stdout.write(f'   {sql}')
+            if entry['plan']:
+                self.stdout.write(f'   plan: {"; ".join(entry["plan"])}')
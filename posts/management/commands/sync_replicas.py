@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts.feed import feed_generation
+from yatube.routers import record_sync
+
+
+class Command(BaseCommand):
+    help = ('Copy the default SQLite database over the replica databases '
+            'with the online backup API.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='Replicas to refresh, all of REPLICA_DATABASES by default.')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Repeat every this many seconds instead of running once.')
+
+    def handle(self, *args, aliases, interval, **options):
+        aliases = aliases or settings.REPLICA_DATABASES
+        if not aliases:
+            raise CommandError('No replicas, set DB_REPLICAS')
+        for alias in aliases:
+            if (alias not in connections.databases
+                    or alias == DEFAULT_DB_ALIAS):
+                raise CommandError(f'{alias!r} is not a replica database')
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # the backup would wait for the transaction forever
+            raise CommandError('Cannot copy the database inside a '
+                               'transaction')
+        while True:
+            for alias in aliases:
+                self.sync(alias)
+            if not interval:
+                break
+            time.sleep(interval)
+
+    def sync(self, alias):
+        path = connections.databases[alias]['NAME']
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        # read before the copy: the copy holds at least this generation
+        generation = feed_generation()
+        synced_at = time.time()
+        started = time.perf_counter()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        target = sqlite3.connect(path)
+        try:
+            # readers of the replica keep their snapshot during the copy
+            target.execute('PRAGMA journal_mode = WAL')
+            # one step: a copy made in several is restarted by every write
+            # to the source in between
+            source.connection.backup(target)
+        finally:
+            target.close()
+        record_sync(alias, generation, synced_at)
+        self.stdout.write(
+            f'{alias}: {path} in {time.perf_counter() - started:.2f} s')
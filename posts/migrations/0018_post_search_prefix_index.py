@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# Prefix queries ("кофе"*) without a prefix index merge the doclists of every
+# matching term on each query, which costs as much as the matching posts.
+# The sync triggers refer to the table by name and keep working.
+TABLE = ("CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+         "text, content='posts_post', content_rowid='id', "
+         "tokenize='unicode61 remove_diacritics 2'{})")
+REBUILD = "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('rebuild')"
+
+FORWARD = [
+    'DROP TABLE posts_post_fts',
+    TABLE.format(", prefix='2 3 4 5 6'"),
+    REBUILD,
+]
+
+BACKWARD = [
+    'DROP TABLE posts_post_fts',
+    TABLE.format(''),
+    REBUILD,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
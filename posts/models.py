@@ -21,9 +21,53 @@ class Post(models.Model):
     group = models.ForeignKey(Group, blank=True, null=True,
                               on_delete=models.SET_NULL)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # filled in by PostForm after the upload is normalized, see posts.images
+    image_width = models.PositiveIntegerField(blank=True, null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField(blank=True, null=True,
+                                               editable=False)
+    image_size = models.PositiveIntegerField(blank=True, null=True,
+                                             editable=False)
+    # maintained by posts.signals, repaired by `manage.py repair_counters`
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # bumped on every change that shows up on the post card, see
+    # posts.templatetags.post_cards
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='posts_post_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='posts_post_author_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='posts_post_group_feed_idx'),
+        ]
+
+    # written with F() expressions only, an instance loaded before a new
+    # comment or thumbnail would save its old values back
+    COUNTER_FIELDS = ('comment_count', 'version')
+
+    def save(self, *args, force_insert=False, update_fields=None,
+             **kwargs):
+        if self._state.adding or self.pk is None or force_insert:
+            # an insert, e.g. of a clone: the values given are written
+            return super().save(*args, force_insert=force_insert,
+                                update_fields=update_fields, **kwargs)
+        if update_fields is None:
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in self.COUNTER_FIELDS]
+        update_fields = {*update_fields, 'version'}
+        # every save changes the card, the bump rides on the same UPDATE
+        self.version = models.F('version') + 1
+        try:
+            super().save(*args, update_fields=update_fields, **kwargs)
+        finally:
+            # reloaded on access
+            del self.__dict__['version']
 
 
 class Comment(models.Model):
@@ -34,6 +78,13 @@ class Comment(models.Model):
     text = models.TextField(blank=False, null=False)
     created = models.DateTimeField("date published", auto_now_add=True)
 
+    class Meta:
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='posts_comment_post_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -43,3 +94,46 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('user', 'author')
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='posts_follow_author_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """A post delivered to the follow feed of a single user.
+
+    Rows are written when a post is published (fan-out on write) and when
+    the user follows its author, so the follow feed is read with one range
+    scan over ``(user, pub_date)`` instead of a join against ``Follow``.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='posts_timeline_feed_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='posts_timeline_author_idx'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Per-user counters shown in the author sidebar.
+
+    Kept up to date incrementally by ``posts.signals``; read through
+    ``posts.stats.get_author_stats`` which caches them.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    post_count = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
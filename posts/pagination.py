@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.shortcuts import redirect
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def encode_position(pub_date, pk):
+    """Pack a (pub_date, id) feed position into an opaque token."""
+    raw = f'{pub_date.isoformat()}|{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def encode_cursor(post):
+    """Pack the feed position of a post into an opaque token."""
+    return encode_position(post.pub_date, post.pk)
+
+
+def decode_cursor(token):
+    """Unpack a cursor token, return None if it is malformed."""
+    try:
+        pub_date, pk = force_str(urlsafe_base64_decode(token)).split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage:
+    """A feed page addressed by a cursor instead of a page number.
+
+    Mirrors the part of ``django.core.paginator.Page`` the templates use,
+    so feeds can switch between the two transparently.
+    """
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        # an empty page, e.g. past a deleted post, has no position to go on
+        # from
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0])
+
+
+def cursor_page(posts, after=None, before=None, per_page=None,
+                date_field='pub_date', id_field='id'):
+    """Fetch one page of ``posts`` past the ``after`` or ``before`` position.
+
+    ``posts`` only has to be filtered, the ordering is imposed here.  Both
+    positions are ``(pub_date, id)`` pairs as returned by ``decode_cursor``.
+    """
+    if per_page is None:
+        per_page = settings.FEED_PAGE_SIZE
+    if before is not None:
+        pub_date, pk = before
+        posts = posts.filter(
+            Q(**{f'{date_field}__gt': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__gt': pk})
+        ).order_by(date_field, id_field)
+    else:
+        if after is not None:
+            pub_date, pk = after
+            posts = posts.filter(
+                Q(**{f'{date_field}__lt': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__lt': pk})
+            )
+        posts = posts.order_by(f'-{date_field}', f'-{id_field}')
+
+    object_list = list(posts[:per_page + 1])
+    has_more = len(object_list) > per_page
+    object_list = object_list[:per_page]
+    # only a page with rows can lead back to where the cursor pointed
+    if before is not None:
+        object_list.reverse()
+        return CursorPage(object_list, has_next=bool(object_list),
+                          has_previous=has_more)
+    return CursorPage(object_list, has_next=has_more,
+                      has_previous=after is not None and bool(object_list))
+
+
+def uncounted_page(items, number, per_page=None):
+    """Fetch page ``number`` of ``items`` without counting all of them.
+
+    For result sets where ``COUNT(*)`` costs as much as the query itself,
+    such as full-text matches.  The page only knows whether there is a
+    next one, which is all prev/next navigation needs.
+    """
+    if per_page is None:
+        per_page = settings.FEED_PAGE_SIZE
+    offset = (number - 1) * per_page
+    object_list = list(items[offset:offset + per_page + 1])
+    page = CursorPage(object_list[:per_page],
+                      has_next=len(object_list) > per_page,
+                      has_previous=number > 1)
+    page.number = number
+    return page
+
+
+def _page_number(request):
+    try:
+        return int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def deep_page_redirect(request, posts, date_field='pub_date', id_field='id'):
+    """Redirect ``?page=N`` past ``FEED_PAGE_NUMBER_LIMIT`` to a cursor.
+
+    Returns None for the numbered pages.  Deeper ones would cost an OFFSET
+    as long as the feed, so the reader is sent to the cursor page that
+    follows the last numbered one instead; the cursor row is read at a
+    bounded offset.
+    """
+    limit = settings.FEED_PAGE_NUMBER_LIMIT
+    if _page_number(request) <= limit:
+        return None
+    position = limit * settings.FEED_PAGE_SIZE
+    last = posts.order_by(f'-{date_field}', f'-{id_field}').values_list(
+        date_field, id_field)[position - 1:position]
+    query = request.GET.copy()
+    if last:
+        del query['page']
+        query['after'] = encode_position(*last[0])
+    else:
+        # the feed ends before that, Paginator serves its last page
+        query['page'] = limit
+    return redirect(f'{request.path}?{query.urlencode()}')
+
+
+def paginate(request, posts, transform=None, **cursor_options):
+    """Build the paginator part of a feed context.
+
+    Requests carrying ``?after=`` or ``?before=`` are served by keyset
+    pagination, which costs the same on any depth.  Plain ``?page=N`` URLs
+    keep using ``Paginator``; past ``FEED_PAGE_NUMBER_LIMIT`` the "next"
+    link switches the reader over to cursors, and views send deeper page
+    numbers there with ``deep_page_redirect``.  Only the rows up to the
+    limit are counted, the links never go further.
+
+    ``transform`` maps the fetched rows to posts when the feed is read
+    from another table, e.g. ``TimelineEntry``.
+    """
+    after = decode_cursor(request.GET.get('after', ''))
+    before = decode_cursor(request.GET.get('before', ''))
+    if after is not None or before is not None:
+        page = cursor_page(posts, after=after, before=before,
+                           **cursor_options)
+        if transform is not None:
+            page.object_list = transform(page.object_list)
+        return {'page': page, 'paginator': None}
+
+    limit = settings.FEED_PAGE_NUMBER_LIMIT
+    per_page = settings.FEED_PAGE_SIZE
+    paginator = Paginator(posts, per_page)
+    # one row past the limit is enough to know the feed goes on
+    paginator.count = posts[:limit * per_page + 1].count()
+    page = paginator.get_page(request.GET.get('page', 1))
+    if transform is not None:
+        page.object_list = transform(page.object_list)
+    next_cursor = None
+    if page.number >= limit and page.has_next():
+        next_cursor = encode_cursor(page[-1])
+    return {
+        'page': page,
+        'paginator': paginator,
+        'page_numbers': range(1, min(paginator.num_pages, limit) + 1),
+        'next_cursor': next_cursor,
+    }
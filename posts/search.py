@@ -0,0 +1,169 @@
+"""Full-text search over post text with an SQLite FTS5 index.
+
+``posts_post_fts`` is an external-content FTS5 table: it stores only the
+inverted index and reads the text back from ``posts_post``.  Triggers keep
+it in sync with every insert, text update and delete, whatever issues them
+(forms, the admin, ``bulk_create``, raw SQL).
+
+SQLite drops a table's triggers when Django rebuilds it during a migration,
+so they are re-created on every ``post_migrate`` by ``install_triggers``.
+
+Every query word is a prefix term, served by the prefix indexes of up to
+six characters.  Results are ranked by bm25 over the newest
+``SEARCH_MAX_CANDIDATES`` matches only: a word found in most posts would
+otherwise have every post ranked on every search.  Snippets are built
+afterwards, for the page being shown.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+FTS_TABLE = 'posts_post_fts'
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='posts_post', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')"
+)
+
+TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+REBUILD = f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+
+# snippet() marks matches with control characters, which cannot appear in
+# the escaped text, and highlight() turns them into <mark> afterwards
+MATCH_START, MATCH_END = '\x02', '\x03'
+SNIPPET_SQL = (f"snippet({FTS_TABLE}, 0, char(2), char(3), '…', "
+               f"%s)")
+SNIPPET_TOKENS = 24
+
+MAX_TERMS = 10
+TERM_RE = re.compile(r'\w+')
+
+
+def install_triggers(connection):
+    """Create the sync triggers if the FTS table exists and they do not."""
+    if connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for statement in TRIGGERS:
+            cursor.execute(statement)
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query: every word, as a prefix.
+
+    Only word characters get through, so user input can never be parsed as
+    FTS5 syntax (quotes, ``NEAR``, column filters).  Returns an empty
+    string when nothing searchable is left.
+    """
+    terms = TERM_RE.findall(query)[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def matching_ids(match):
+    """Subquery of the ids of posts matching an FTS5 expression."""
+    return RawSQL(f'SELECT rowid FROM {FTS_TABLE} '
+                  f'WHERE {FTS_TABLE} MATCH %s', [match])
+
+
+class SearchResults:
+    """Posts matching an FTS5 expression, best first, read by slicing.
+
+    A slice runs three queries: the ranked ids of the slice, the posts and
+    the snippets of those posts.  Every post gets ``rank`` (bm25, lower is
+    better) and ``snippet``, the matching fragment of the text.
+    """
+
+    def __init__(self, posts, match):
+        self.posts = posts
+        self.match = match
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('SearchResults only support slices')
+        offset = index.start or 0
+        ranked = self.ranked(offset, index.stop - offset)
+        if not ranked:
+            return []
+        posts = self.posts.in_bulk([pk for pk, rank in ranked])
+        snippets = self.snippets(posts)
+        results = []
+        for pk, rank in ranked:
+            post = posts[pk]
+            post.rank = rank
+            post.snippet = snippets.get(pk, '')
+            results.append(post)
+        return results
+
+    def ranked(self, offset, limit):
+        """Return ``(id, rank)`` of ``limit`` matches from ``offset``."""
+        # the newest candidates come straight from the index in rowid order
+        candidates = self.posts.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = posts_post.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[self.match],
+            select={'rank': f'{FTS_TABLE}.rank'},
+            order_by=[f'-{FTS_TABLE}.rowid'],
+        ).values_list('id', 'rank')[:settings.SEARCH_MAX_CANDIDATES]
+        connection = connections[self.posts.db]
+        sql, params = candidates.query.get_compiler(
+            connection=connection).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id, rank FROM ({sql}) ORDER BY rank, id DESC '
+                f'LIMIT %s OFFSET %s', [*params, limit, offset])
+            return cursor.fetchall()
+
+    def snippets(self, posts):
+        placeholders = ', '.join(['%s'] * len(posts))
+        with connections[self.posts.db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, {SNIPPET_SQL} FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})',
+                [SNIPPET_TOKENS, self.match, *posts])
+            return dict(cursor.fetchall())
+
+
+def search_posts(posts, match):
+    """Restrict ``posts`` to ``match`` and order them by relevance.
+
+    Returns ``SearchResults``, which are read by slicing.
+    """
+    return SearchResults(posts, match)
+
+
+def highlight(snippet):
+    """Escape a snippet and wrap its matches in ``<mark>``."""
+    html = escape(snippet)
+    html = html.replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+    return mark_safe(html)
@@ -0,0 +1,66 @@
+from django.db.models import F
+from django.db import connections
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from . import search, stats, timeline
+from .feed import bump_feed_generation
+from .models import Group, Post, Comment, Follow
+
+
+@receiver(post_save, sender=Post)
+def deliver_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+        stats.bump(instance.author_id, 'post_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.bump(instance.author_id, 'post_count', -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+def invalidate_feeds(sender, raw=False, **kwargs):
+    if not raw:
+        bump_feed_generation()
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+        stats.bump(instance.author_id, 'follower_count', 1)
+        stats.bump(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+    stats.bump(instance.author_id, 'follower_count', -1)
+    stats.bump(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1, version=F('version') + 1)
+        stats.bump(instance.author_id, 'comment_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1, version=F('version') + 1)
+    stats.bump(instance.author_id, 'comment_count', -1)
+
+
+@receiver(post_migrate)
+def install_search_triggers(sender, app_config, using, **kwargs):
+    if app_config.label == 'posts':
+        search.install_triggers(connections[using])
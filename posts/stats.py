@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F
+
+from .models import Post, Comment, Follow, AuthorStats
+
+STAT_FIELDS = ('post_count', 'follower_count', 'following_count',
+               'comment_count')
+
+# counter name -> (model, lookup that ties a row of it to the user)
+STAT_SOURCES = {
+    'post_count': (Post, 'author_id'),
+    'follower_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+    'comment_count': (Comment, 'author_id'),
+}
+
+
+def _cache_key(user_id):
+    return f'author_stats:{user_id}'
+
+
+def count_stats(user_ids):
+    """Count the stats of ``user_ids`` from scratch, one query per counter.
+
+    Counted on the default database even in views reading from a replica:
+    the counts are stored in ``AuthorStats``, a lagging replica would leave
+    them off for good.
+    """
+    stats = {user_id: dict.fromkeys(STAT_FIELDS, 0) for user_id in user_ids}
+    for field, (model, lookup) in STAT_SOURCES.items():
+        totals = (model.objects.using(DEFAULT_DB_ALIAS)
+                  .filter(**{f'{lookup}__in': user_ids})
+                  .order_by().values(lookup).annotate(total=Count('pk'))
+                  .values_list(lookup, 'total'))
+        for user_id, total in totals:
+            stats[user_id][field] = total
+    return stats
+
+
+def get_author_stats(user_id):
+    """Return the counters of a user as a dict, creating the row if needed."""
+    key = _cache_key(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = AuthorStats.objects.filter(user_id=user_id).values(
+            *STAT_FIELDS).first()
+        if stats is None:
+            stats = count_stats([user_id])[user_id]
+            AuthorStats.objects.get_or_create(user_id=user_id,
+                                              defaults=stats)
+        cache.set(key, stats, settings.AUTHOR_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def bump(user_id, field, delta):
+    """Shift one counter of a user by ``delta`` and drop the cached copy.
+
+    Users without a stats row are left alone: the row is counted from
+    scratch on first read and would then include this change anyway.
+    """
+    AuthorStats.objects.filter(
+        user_id=user_id, **{f'{field}__gte': -delta}).update(
+        **{field: F(field) + delta})
+    forget(user_id)
+
+
+def forget(user_id):
+    cache.delete(_cache_key(user_id))
+    if transaction.get_connection().in_atomic_block:
+        # a read before the commit caches the old counters again
+        transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
@@ -0,0 +1,52 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import prefetch_thumbnails
+
+register = template.Library()
+
+
+def card_key(post, user):
+    """Cache key of a rendered post card.
+
+    ``Post.version`` changes whenever the card content does.  The only
+    per-user part of a card is the edit link shown to the author, so each
+    post has at most two variants.
+    """
+    is_author = user is not None and user.pk == post.author_id
+    return f'post_card:{post.pk}:{post.version}:{int(is_author)}'
+
+
+def render_cards(posts, user):
+    """Render the cards of ``posts`` with a single cache round trip."""
+    posts = list(posts)
+    keys = [card_key(post, user) for post in posts]
+    cached = cache.get_many(keys)
+    # only the cards that have to be rendered need their thumbnails
+    prefetch_thumbnails(post for key, post in zip(keys, posts)
+                        if key not in cached)
+    fresh = {}
+    cards = []
+    for key, post in zip(keys, posts):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string('includes/post_card.html',
+                                    {'post': post, 'user': user})
+            fresh[key] = card
+        cards.append(card)
+    if fresh:
+        cache.set_many(fresh, settings.POST_CARD_CACHE_TIMEOUT)
+    return mark_safe(''.join(cards))
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    return render_cards(posts, context.get('user'))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    return render_cards([post], context.get('user'))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.client import Client
+
+from posts.models import Post, Group, Follow
+
+
+class FeedTestCase(TestCase):
+    """An author with ``post_count`` posts in a group and a reader.
+
+    Names are made from ``prefix``.  The reader follows the author and
+    ``self.client`` is logged in as the reader unless the subclass turns
+    ``follow_author`` or ``log_in`` off.  Caches are cleared around every
+    test.
+    """
+    prefix = 'feed'
+    post_count = 1
+    follow_author = True
+    log_in = True
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username=f'{self.prefix}_author')
+        self.reader = User.objects.create(username=f'{self.prefix}_reader')
+        self.group = Group.objects.create(title=self.prefix,
+                                          slug=self.prefix)
+        self.posts = [self.create_post(number)
+                      for number in range(self.post_count)]
+        if self.follow_author:
+            Follow.objects.create(user=self.reader, author=self.author)
+        self.client = Client()
+        if self.log_in:
+            self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create_post(self, number):
+        return Post.objects.create(text=f'{self.prefix} post {number}',
+                                   author=self.author, group=self.group)
@@ -0,0 +1,97 @@
+import json
+
+from django.test import override_settings
+from django.urls import reverse
+
+from posts.models import Post, Comment, Follow
+from posts.tests.base import FeedTestCase
+
+
+@override_settings(API_PAGE_SIZE=3)
+class TestApi(FeedTestCase):
+    prefix = 'api'
+    post_count = 7
+    follow_author = False
+    log_in = False
+
+    def create_post(self, number):
+        return Post.objects.create(text=f'Пост {number}', author=self.author,
+                                   group=self.group if number % 2 else None)
+
+    def walk(self, url):
+        """Follow the next links of a feed, return the ids of all pages."""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual('application/json', response['Content-Type'])
+            data = json.loads(response.content)
+            ids.extend(post['id'] for post in data['results'])
+            url = data['next']
+        return ids
+
+    def test_feeds(self):
+        newest_first = [post.pk for post in reversed(self.posts)]
+        self.assertEqual(newest_first, self.walk(reverse('api_posts')))
+        self.assertEqual(
+            [pk for pk in newest_first
+             if Post.objects.get(pk=pk).group_id],
+            self.walk(reverse('api_group_posts', args=['api'])))
+        self.assertEqual(newest_first, self.walk(
+            reverse('api_profile_posts', args=['api_author'])))
+
+        data = json.loads(self.client.get(reverse('api_posts')).content)
+        self.assertEqual({
+            'id': self.posts[-1].pk, 'text': 'Пост 6',
+            'pub_date': self.posts[-1].pub_date.isoformat(),
+            'author': 'api_author', 'group': None, 'image': None,
+            'image_width': None, 'image_height': None, 'comment_count': 0,
+        }, data['results'][0])
+        # compact and not escaped
+        self.assertIn('"text":"Пост 6"',
+                      self.client.get(reverse('api_posts')).content.decode())
+
+        self.assertEqual(404, self.client.get(
+            reverse('api_group_posts', args=['missing'])).status_code)
+        self.assertEqual(404, self.client.get(
+            reverse('api_profile_posts', args=['missing'])).status_code)
+
+    def test_follow_feed(self):
+        url = reverse('api_follow_posts')
+        self.assertEqual(403, self.client.get(url).status_code)
+        self.client.force_login(self.reader)
+        self.assertEqual([], self.walk(url))
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual([post.pk for post in reversed(self.posts)],
+                         self.walk(url))
+
+    def test_post_with_comments(self):
+        post = self.posts[0]
+        comments = [Comment.objects.create(post=post, author=self.reader,
+                                           text=f'comment {i}')
+                    for i in range(5)]
+        url = reverse('api_post', args=[post.pk])
+        data = json.loads(self.client.get(url).content)
+        self.assertEqual(5, data['comment_count'])
+        self.assertEqual(['comment 0', 'comment 1', 'comment 2'],
+                         [comment['text'] for comment in data['comments']])
+        self.assertEqual('api_reader', data['comments'][0]['author'])
+        data = json.loads(self.client.get(data['next']).content)
+        self.assertEqual([comment.pk for comment in comments[3:]],
+                         [comment['id'] for comment in data['comments']])
+        self.assertIsNone(data['next'])
+        self.assertEqual(404, self.client.get(
+            reverse('api_post', args=[0])).status_code)
+
+    def test_conditional_get(self):
+        for url in (reverse('api_posts'), reverse('api_post',
+                                                  args=[self.posts[0].pk])):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(304, self.client.get(
+                url, HTTP_IF_NONE_MATCH=etag).status_code)
+        url = reverse('api_post', args=[self.posts[0].pk])
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.posts[0], author=self.reader,
+                               text='new')
+        self.assertEqual(200, self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code)
@@ -1,17 +1,36 @@
+import json
 import os
-from io import BytesIO
-from time import sleep
+import sqlite3
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 from PIL import Image
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, router
+from django.http import HttpResponse
 from django.test.client import Client
-from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django.core.files.images import ImageFile, File
 
-from posts.models import Post, Group, Follow
+from posts.models import (Post, Group, Comment, Follow, TimelineEntry,
+                          AuthorStats)
+from posts import stats, thumbnails, writer
+from posts.feed import feed_generation
+from posts.pagination import encode_cursor
+from yatube.routers import (PIN_COOKIE, read_from_replica, record_sync,
+                            sync_key)
 from yatube.settings import BASE_DIR, TEMPLATE_CACHE_TIMEOUTS
 
 
@@ -27,6 +46,7 @@ class TestStringMethods(TestCase):
 class TestPosts(TestCase):
 
     def setUp(self):
+        cache.clear()
         self._unlogged_client = Client()
         self._logged_client = Client()
         user_login_data = dict(username='my_user',
@@ -166,6 +186,27 @@ class TestPosts(TestCase):
         self._post = self.check_post_in_posts()
         self.post_text_is_found_on_post_pages(find_img_tag=True)
 
+    def test_uploaded_image_is_normalized(self):
+        io_image = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees clockwise
+        exif[0x010f] = 'Camera maker'
+        Image.new('RGB', size=(200, 100)).save(io_image, 'jpeg',
+                                                exif=exif.tobytes())
+        data = {'text': self._post.text, 'group': self._post.group.pk,
+                'image': SimpleUploadedFile('photo.JPG', io_image.getvalue())}
+        with override_settings(POST_IMAGE_MAX_SIZE=(60, 80)):
+            self._logged_client.post(reverse('post_new'), data=data)
+
+        post = Post.objects.get(text=self._post.text)
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        # upright 100x200, fitted into 60x80
+        self.assertEqual((40, 80), (post.image_width, post.image_height))
+        self.assertEqual(post.image.size, post.image_size)
+        with Image.open(post.image) as stored:
+            self.assertEqual((40, 80), stored.size)
+            self.assertEqual(0, len(stored.getexif()))
+
     def test_cant_publish_post_with_fake_image(self):
         data = {'text': self._post.text, 'group': self._post.group.pk,
                 'image': SimpleUploadedFile('file.txt', b'i-am-a-text-file')}
@@ -190,16 +231,8 @@ class TestPosts(TestCase):
         post_id = self._post.pk
         self.check_edit_post()
 
-        if index_cache_timeout:
-            self.assertGreaterEqual(
-                index_cache_timeout, 1,
-                ('Increase index_cache_timeout to a value '
-                 'greater than 1 for this test to work'))
-            sleep(index_cache_timeout - 1)
-            self.check_page_contains('index', initial_post_text)
-            self.check_page_not_contains('index', self._post.text)
-            sleep(1)
-
+        # the edit bumps the feed generation, so a cached index page must
+        # not outlive it no matter how long the cache timeout is
         self.text_is_not_found_on_post_pages(initial_post_text, post_id)
         self.post_text_is_found_on_post_pages()
 
@@ -212,7 +245,22 @@ class TestPosts(TestCase):
     # sprint 6
 
     def test_index_template_cache(self):
-        self.check_logged_user_can_edit(index_cache_timeout=3)
+        self.check_logged_user_can_edit(index_cache_timeout=60)
+
+    def test_index_template_cache_is_page_aware(self):
+        posts = [Post.objects.create(text=f'paged post {i}',
+                                     author=self._user)
+                 for i in range(11)]
+        index_url = reverse('index')
+        self.assertContains(self._unlogged_client.get(index_url),
+                            posts[-1].text)
+        response = self._unlogged_client.get(index_url, {'page': 2})
+        self.assertContains(response, posts[0].text)
+        self.assertNotContains(response, posts[-1].text)
+
+        new_post = Post.objects.create(text='brand new post',
+                                       author=self._user)
+        self.check_page_contains('index', new_post.text)
 
     def check_follow_author(self, author: User):
         follow_url = reverse('profile_follow',
@@ -269,3 +317,624 @@ class TestPosts(TestCase):
 
         unlogged_response = self._unlogged_client.get(post_url)
         self.assertNotContains(unlogged_response, '<form>')
+
+    def test_cursor_pagination_walks_whole_feed(self):
+        posts = [Post.objects.create(text=f'cursor post {i}',
+                                     author=self._user)
+                 for i in range(25)]
+        expected = [post.pk for post in reversed(posts)]
+        index_url = reverse('index')
+
+        seen, query = [], {}
+        while True:
+            response = self._unlogged_client.get(index_url, query)
+            page = response.context['page']
+            seen += [post.pk for post in page]
+            if not page.has_next():
+                break
+            query = {'after': encode_cursor(page[len(page) - 1])}
+        self.assertEqual(expected, seen)
+
+        response = self._unlogged_client.get(
+            index_url, {'before': encode_cursor(page[0])})
+        self.assertEqual(expected[10:20],
+                         [post.pk for post in response.context['page']])
+        self.assertContains(response, '?after=')
+        self.assertContains(response, '?before=')
+
+    def test_cursor_past_either_end_of_feed(self):
+        posts = [Post.objects.create(text=f'edge post {i}',
+                                     author=self._user)
+                 for i in range(3)]
+        index_url = reverse('index')
+        for query in ({'before': encode_cursor(posts[-1])},
+                      {'after': encode_cursor(posts[0])}):
+            response = self._unlogged_client.get(index_url, query)
+            self.assertEqual(200, response.status_code)
+            page = response.context['page']
+            self.assertEqual(0, len(page))
+            self.assertFalse(page.has_other_pages())
+            self.assertIsNone(page.next_cursor)
+            self.assertIsNone(page.previous_cursor)
+
+    @override_settings(FEED_PAGE_NUMBER_LIMIT=2)
+    def test_page_numbers_are_bounded(self):
+        posts = [Post.objects.create(text=f'numbered post {i}',
+                                     author=self._user)
+                 for i in range(35)]
+        index_url = reverse('index')
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self._unlogged_client.get(index_url)
+        counts = [query['sql'] for query in captured.captured_queries
+                  if 'COUNT(' in query['sql']]
+        self.assertEqual(1, len(counts))
+        self.assertIn('LIMIT 21', counts[0])
+        self.assertEqual([1, 2], list(response.context['page_numbers']))
+
+        response = self._unlogged_client.get(index_url, {'page': 3})
+        self.assertRedirects(
+            response, f'{index_url}?after={encode_cursor(posts[15])}')
+        response = self._unlogged_client.get(response.url)
+        self.assertEqual(posts[14], response.context['page'][0])
+
+    def test_follow_feed_is_read_from_timeline(self):
+        author = User.objects.create(username='test_author')
+        old_posts = [Post.objects.create(text=f'old post {i}', author=author)
+                     for i in range(12)]
+        self.check_follow_author(author)
+        self.assertEqual(12, TimelineEntry.objects.filter(
+            user=self._user).count())
+
+        new_post = Post.objects.create(text='fresh post', author=author)
+        follow_index_url = reverse('follow_index')
+        response = self._logged_client.get(follow_index_url)
+        self.assertEqual(new_post, response.context['page'][0])
+
+        last_seen = response.context['page'][len(response.context['page']) - 1]
+        response = self._logged_client.get(
+            follow_index_url, {'after': encode_cursor(last_seen)})
+        self.assertEqual(old_posts[2::-1],
+                         list(response.context['page']))
+
+        self.check_unfollow_author(author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self._user).exists())
+
+    def test_comment_count_is_maintained(self):
+        post = Post.objects.create(text='count my comments', author=self._user)
+        comment_url = reverse('add_comment', kwargs={
+            'username': self._user.username, 'post_id': post.pk})
+        for text in ('first', 'second'):
+            self._logged_client.post(comment_url, {'text': text})
+        post.refresh_from_db()
+        self.assertEqual(2, post.comment_count)
+
+        post.comments.first().delete()
+        post.refresh_from_db()
+        self.assertEqual(1, post.comment_count)
+
+        Post.objects.filter(pk=post.pk).update(comment_count=42)
+        call_command('repair_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(1, post.comment_count)
+        self.check_page_contains('index', '1 комментариев')
+
+    def test_saving_a_stale_post_keeps_its_counters(self):
+        post = Post.objects.create(text='edit me', author=self._user)
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self._user, text='racing')
+        post.refresh_from_db()
+
+        stale.text = 'edited'
+        stale.save()
+        self.assertEqual(post.version + 1, stale.version)
+        stale.refresh_from_db()
+        self.assertEqual(1, stale.comment_count)
+        self.assertEqual('edited', stale.text)
+
+    def test_post_can_be_saved_as_a_new_row(self):
+        post = Post.objects.create(text='original', author=self._user)
+        post.pk = None
+        post.save()
+        self.assertEqual(2, Post.objects.filter(text='original').count())
+
+        post = Post.objects.get(pk=post.pk)
+        post.pk += 100
+        post.save(force_insert=True)
+        self.assertEqual(3, Post.objects.filter(text='original').count())
+
+    def test_author_stats_follow_writes(self):
+        author = User.objects.create(username='test_author')
+        Post.objects.create(text='first', author=author)
+        profile_url = reverse('profile', kwargs={'username': author.username})
+        response = self._unlogged_client.get(profile_url)
+        self.assertEqual(1, response.context['stats']['post_count'])
+        self.assertEqual(0, response.context['stats']['follower_count'])
+
+        self.check_follow_author(author)
+        Post.objects.create(text='second', author=author)
+        response = self._unlogged_client.get(profile_url)
+        self.assertEqual(2, response.context['stats']['post_count'])
+        self.assertContains(response, 'Подписчиков: 1')
+
+        AuthorStats.objects.filter(user=author).update(post_count=7)
+        call_command('repair_counters', stdout=StringIO())
+        self.check_unfollow_author(author)
+        response = self._unlogged_client.get(profile_url)
+        self.assertEqual(2, response.context['stats']['post_count'])
+        self.assertEqual(0, response.context['stats']['follower_count'])
+
+    def test_post_card_cache_keeps_edit_link_per_user(self):
+        self.publish_post_with_new()
+        edit_url = reverse('post_edit', args=[self._user.username,
+                                              self._post.pk])
+        profile_url = reverse('profile',
+                              kwargs={'username': self._user.username})
+        for _ in range(2):
+            self.assertContains(self._logged_client.get(profile_url),
+                                edit_url)
+            self.assertNotContains(self._unlogged_client.get(profile_url),
+                                   edit_url)
+
+        self.check_edit_post()
+        response = self._unlogged_client.get(profile_url)
+        self.assertContains(response, 'edited post text')
+        self.assertNotContains(response, 'test post text')
+
+    def test_signup_rejects_usernames_of_other_pages(self):
+        data = {'username': 'search', 'password1': 'Xk39!pass-word',
+                'password2': 'Xk39!pass-word'}
+        response = self._unlogged_client.post(reverse('signup'), data)
+        self.assertFormError(response, 'form', 'username',
+                             'Это имя пользователя занято.')
+        self.assertFalse(User.objects.filter(username='search').exists())
+
+        data['username'] = 'searcher'
+        self._unlogged_client.post(reverse('signup'), data)
+        self.assertTrue(User.objects.filter(username='searcher').exists())
+
+    def test_public_pages_answer_conditional_get(self):
+        post = Post.objects.create(text='etag me', author=self._user,
+                                   group=self._post.group)
+        urls = self.get_page_urls_for_post(post.pk)
+        etags = {}
+        for url_name, url_kwargs in urls.items():
+            url = reverse(url_name, kwargs=url_kwargs)
+            etags[url] = self._unlogged_client.get(url)['ETag']
+            response = self._unlogged_client.get(
+                url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(304, response.status_code, url)
+
+        comment_url = reverse('add_comment', kwargs=urls['post'])
+        self._logged_client.post(comment_url, {'text': 'new comment'})
+        for url, etag in etags.items():
+            response = self._unlogged_client.get(url,
+                                                 HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(200, response.status_code, url)
+
+    def test_conditional_get_follows_the_viewer(self):
+        author = User.objects.create(username='etag_author')
+        post = Post.objects.create(text='etag me', author=author)
+        profile_url = reverse('profile', kwargs={'username': 'etag_author'})
+        post_url = reverse('post', kwargs={'username': 'etag_author',
+                                           'post_id': post.pk})
+        etags = {url: self._logged_client.get(url)['ETag']
+                 for url in (profile_url, post_url)}
+
+        self._logged_client.get(reverse('profile_follow',
+                                        kwargs={'username': 'etag_author'}))
+        response = self._logged_client.get(
+            profile_url, HTTP_IF_NONE_MATCH=etags[profile_url])
+        self.assertEqual(200, response.status_code)
+
+        # a new session gets a new CSRF secret for the comment form
+        self._logged_client.logout()
+        self._logged_client.force_login(self._user)
+        response = self._logged_client.get(
+            post_url, HTTP_IF_NONE_MATCH=etags[post_url])
+        self.assertEqual(200, response.status_code)
+        response = self._logged_client.get(
+            post_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, response.status_code)
+
+    def test_thumbnail_is_generated_off_the_request(self):
+        data = {'text': self._post.text, 'group': self._post.group.pk,
+                'image': File(self.generate_image(), 'image.png')}
+        with mock.patch('posts.thumbnails._submit') as submit:
+            self._logged_client.post(reverse('post_new'), data=data)
+            post = self.check_post_in_posts()
+            self.check_page_contains('index', 'data:image/svg+xml')
+            submit.assert_called_with(post.pk, post.image.name)
+
+        thumbnails.generate(post.pk, post.image.name)
+        thumbnail_url = thumbnails.find_thumbnail(post.image).url
+        self.check_page_contains('index', thumbnail_url)
+        self.check_page_not_contains('index', 'data:image/svg+xml')
+
+    def test_feed_thumbnails_are_looked_up_together(self):
+        for i in range(3):
+            Post.objects.create(text=f'image post {i}', author=self._user,
+                                image=f'posts/missing_{i}.jpg')
+        with mock.patch('posts.thumbnails._submit') as submit, \
+                CaptureQueriesContext(connection) as captured:
+            self.check_page_contains('index', 'data:image/svg+xml')
+        lookups = [query['sql'] for query in captured.captured_queries
+                   if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(1, len(lookups), lookups)
+        self.assertEqual(3, submit.call_count)
+
+    def test_regenerate_thumbnails_command(self):
+        name = default_storage.save('posts/regenerate.png',
+                                    ContentFile(self.generate_image().read()))
+        post = Post.objects.create(text='regenerate', author=self._user,
+                                   image=name)
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+        options = {'workers': 1, 'checkpoint': checkpoint,
+                   'stdout': StringIO()}
+
+        call_command('regenerate_thumbnails', **options)
+        self.assertIsNotNone(thumbnails.find_thumbnail(post.image))
+        self.assertIn('generated 1', options['stdout'].getvalue())
+        self.assertFalse(os.path.exists(checkpoint))
+
+        options['stdout'] = StringIO()
+        call_command('regenerate_thumbnails', **options)
+        self.assertIn('skipped 1', options['stdout'].getvalue())
+
+        # an interrupted run picks up after the last finished batch
+        with open(checkpoint, 'w') as file:
+            file.write(f'{{"last_pk": {post.pk}}}')
+        options['stdout'] = StringIO()
+        call_command('regenerate_thumbnails', **options)
+        self.assertIn('Done: 0 images', options['stdout'].getvalue())
+
+    def test_search_uses_full_text_index(self):
+        group = self._post.group
+        other = User.objects.create(username='other_author')
+        post = Post.objects.create(
+            text='Варим <b>кофе</b> в турке', author=self._user, group=group)
+        Post.objects.create(text='Кофемашина и кофе', author=other)
+        Post.objects.create(text='Про чай', author=other)
+
+        response = self._unlogged_client.get(reverse('search'), {'q': 'КОФЕ'})
+        self.assertEqual(2, len(response.context['page']))
+        self.assertContains(response, '<mark>кофе</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+
+        response = self._unlogged_client.get(
+            reverse('search'), {'q': 'кофе', 'group': group.slug})
+        self.assertEqual([post], list(response.context['page']))
+        response = self._unlogged_client.get(
+            reverse('search'), {'q': 'кофе', 'author': 'other_author'})
+        self.assertEqual(1, len(response.context['page']))
+
+        # FTS5 syntax in the query is treated as plain words
+        response = self._unlogged_client.get(
+            reverse('search'), {'q': '"кофе NEAR( text:'})
+        self.assertEqual(200, response.status_code)
+
+        post.text = 'Варим какао'
+        post.save()
+        response = self._unlogged_client.get(reverse('search'), {'q': 'какао'})
+        self.assertEqual([post], list(response.context['page']))
+        post.delete()
+        response = self._unlogged_client.get(reverse('search'), {'q': 'какао'})
+        self.assertEqual(0, len(response.context['page']))
+
+    @override_settings(SEARCH_MAX_CANDIDATES=3)
+    def test_search_ranks_newest_candidates_only(self):
+        posts = [Post.objects.create(text=f'кофе {"кофе " * i}',
+                                     author=self._user)
+                 for i in range(5)]
+        response = self._unlogged_client.get(reverse('search'), {'q': 'коф'})
+        found = list(response.context['page'])
+        # the two oldest are left out, the rest come best match first
+        self.assertEqual(set(posts[2:]), set(found))
+        self.assertEqual(sorted(post.rank for post in found),
+                         [post.rank for post in found])
+        self.assertTrue(all('<mark>' in post.highlighted for post in found))
+
+    def test_admin_search_uses_full_text_index(self):
+        admin = User.objects.create_superuser('admin', 'admin@test.com',
+                                              'admin_password')
+        Post.objects.create(text='уникальное слово', author=self._user)
+        Post.objects.create(text='другое', author=self._user)
+        self._logged_client.force_login(admin)
+        response = self._logged_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'уникальн'})
+        self.assertEqual(1, response.context['cl'].result_count)
+
+    def test_jsonl_export_import_round_trip(self):
+        author = User.objects.create(username='exported_author')
+        post = Post.objects.create(text='exported post', author=author,
+                                   group=self._post.group)
+        Comment.objects.create(post=post, author=self._user, text='first')
+        Comment.objects.create(post=post, author=author, text='second')
+        Follow.objects.create(user=self._user, author=author)
+        path = os.path.join(tempfile.mkdtemp(), 'dump.jsonl')
+        call_command('export_jsonl', path, stderr=StringIO())
+        with open(path) as dump:
+            self.assertEqual(
+                ['group', 'post', 'comment', 'comment', 'follow'],
+                [json.loads(line)['model'] for line in dump])
+
+        # loading next to the originals: every row gets a new key
+        Follow.objects.all().delete()
+        call_command('import_jsonl', path, batch_size=1, stdout=StringIO())
+        self.assertEqual(1, Group.objects.count())
+        copies = Post.objects.filter(text='exported post')
+        self.assertEqual(2, copies.count())
+        copy = copies.exclude(pk=post.pk).get()
+        self.assertEqual((post.pub_date, author, self._post.group),
+                         (copy.pub_date, copy.author, copy.group))
+        self.assertEqual(2, copy.comment_count)
+        self.assertEqual(['first', 'second'],
+                         [comment.text for comment in copy.comments.all()])
+        self.assertEqual(
+            {post.pk, copy.pk},
+            set(TimelineEntry.objects.filter(user=self._user)
+                .values_list('post_id', flat=True)))
+
+    def test_imported_follows_are_backfilled_per_batch(self):
+        authors = [User.objects.create(username=f'author_{i}')
+                   for i in range(3)]
+        for author in authors:
+            Post.objects.create(text='backfilled', author=author)
+        path = os.path.join(tempfile.mkdtemp(), 'follows.jsonl')
+        with open(path, 'w') as dump:
+            for author in authors:
+                dump.write(json.dumps({'model': 'follow', 'user': 'my_user',
+                                       'author': author.username}) + '\n')
+
+        with CaptureQueriesContext(connection) as captured:
+            call_command('import_jsonl', path, stdout=StringIO())
+        timeline_reads = [
+            query for query in captured.captured_queries
+            if 'FROM "posts_post" WHERE "posts_post"."author_id"'
+            in query['sql']]
+        self.assertEqual(1, len(timeline_reads))
+        self.assertEqual(3, TimelineEntry.objects.filter(
+            user=self._user).count())
+
+    def test_generate_dataset(self):
+        options = {'users': 30, 'groups': 3, 'posts': 200, 'comments': 300,
+                   'follows_per_user': 5, 'celebrities': 2,
+                   'batch_size': 64, 'stdout': StringIO()}
+        call_command('generate_dataset', prefix='one', **options)
+        call_command('generate_dataset', prefix='two', **options)
+
+        for prefix in ('one', 'two'):
+            posts = Post.objects.filter(author__username__startswith=prefix)
+            self.assertEqual(200, posts.count())
+            self.assertEqual(300, Comment.objects.filter(
+                post__in=posts).count())
+            self.assertGreater(posts.exclude(image='').count(), 0)
+        # the same seed gives the same data
+        texts = [list(Post.objects.filter(author__username__startswith=prefix)
+                      .order_by('pk').values_list('text', 'pub_date'))
+                 for prefix in ('one', 'two')]
+        self.assertEqual(texts[0], texts[1])
+
+        post = Post.objects.filter(comment_count__gt=0).first()
+        self.assertEqual(post.comments.count(), post.comment_count)
+        follow = Follow.objects.filter(
+            user__username__startswith='one').first()
+        self.assertEqual(
+            Post.objects.filter(author=follow.author).count(),
+            TimelineEntry.objects.filter(user=follow.user,
+                                         author=follow.author).count())
+
+    @override_settings(REQUEST_LOG_SAMPLE_RATE=1)
+    def test_requests_are_profiled(self):
+        with self.assertLogs('yatube.requests') as logs, \
+                CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('index'))
+        queries = len(captured)
+        self.assertRegex(response['Server-Timing'],
+                         rf'^total;dur=[\d.]+, sql;dur=[\d.]+;'
+                         rf'desc="{queries} queries", tpl;dur=[\d.]+, '
+                         rf'cache;desc="\d+ hits, [1-9]\d* misses"$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual('index', record['view'])
+        self.assertEqual(200, record['status'])
+        self.assertEqual(queries, record['queries'])
+        self.assertGreater(record['template_ms'], 0)
+
+        # the rendered page is cached now
+        with self.assertLogs('yatube.requests') as logs:
+            self.client.get(reverse('index'))
+        self.assertGreater(
+            json.loads(logs.records[0].getMessage())['cache_hits'], 0)
+
+    @override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_SAMPLE_RATE=1)
+    def test_slow_queries_are_logged_with_plan(self):
+        with self.assertLogs('yatube.slow_queries') as logs, \
+                CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('index'))
+        # the EXPLAIN queries are not reported again
+        self.assertEqual(len(captured) - sum(
+            'QUERY PLAN' in query['sql'] for query in captured),
+            len(logs.records))
+        records = [json.loads(record.getMessage())
+                   for record in logs.records]
+        select = next(record for record in records
+                      if record['sql'].startswith('SELECT'))
+        self.assertEqual('index', select['view'])
+        self.assertTrue(select['plan'])
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as log:
+            log.write('\n'.join(record.getMessage()
+                                for record in logs.records))
+            log.write('\n{"cut short')
+            log.flush()
+            out = StringIO()
+            call_command('slow_query_report', log.name, stdout=out)
+        report = out.getvalue()
+        self.assertIn(f'{len(records)} slow queries', report)
+        self.assertIn('1 unreadable lines skipped', report)
+        self.assertIn(select['fingerprint'], report)
+
+    def test_database_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(1, cursor.fetchone()[0])
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(5000, cursor.fetchone()[0])
+
+    @override_settings(REPLICA_DATABASES=['replica1'])
+    def test_read_only_views_use_fresh_replicas(self):
+        databases = []
+        generations = []
+
+        @read_from_replica
+        def view(request):
+            databases.append(router.db_for_read(Post))
+            generations.append(feed_generation())
+            # 'replica1' is not configured, counting there would fail
+            stats.count_stats([self._user.pk])
+            return HttpResponse()
+
+        factory = RequestFactory()
+        pinned = factory.get('/')
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        # never synced
+        view(factory.get('/'))
+        synced = feed_generation()
+        record_sync('replica1', synced, time.time())
+        for request in (factory.get('/'), factory.post('/'), pinned):
+            view(request)
+        self.assertEqual(['default', 'replica1', 'default', 'default'],
+                         databases)
+        # behind the last post but within the lag: pages are keyed on the
+        # copied generation
+        post = Post.objects.create(text='new', author=self._user)
+        view(factory.get('/'))
+        self.assertEqual('replica1', databases[-1])
+        self.assertEqual(synced, generations[-1])
+        self.assertNotEqual(synced, feed_generation())
+        # copied too long ago
+        record_sync('replica1', synced,
+                    time.time() - settings.REPLICA_MAX_LAG - 1)
+        view(factory.get('/'))
+        self.assertEqual('default', databases[-1])
+
+        self.client.force_login(self._user)
+        response = self.client.post(
+            reverse('add_comment', args=[self._user.username, post.pk]),
+            {'text': 'comment'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+# the backup API cannot read a database while a transaction is open on it
+class TestRegenerateThumbnails(TransactionTestCase):
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_workers_open_own_connections(self):
+        image = BytesIO()
+        Image.new('RGBA', size=(100, 100)).save(image, 'png')
+        name = default_storage.save('posts/regenerate.png',
+                                    ContentFile(image.getvalue()))
+        author = User.objects.create(username='regenerated')
+        post = Post.objects.create(text='regenerate', author=author,
+                                   image=name)
+        create_thumbnail = thumbnails.create_thumbnail
+        parent_connection = connections['default'].connection
+
+        def create_in_worker(name):
+            # runs in a forked worker, after the parent queried the batch
+            if connections['default'].connection is parent_connection:
+                raise AssertionError('inherited connection')
+            return create_thumbnail(name)
+
+        options = {'workers': 2, 'restart': True, 'stdout': StringIO(),
+                   'stderr': StringIO(),
+                   'checkpoint': os.path.join(tempfile.mkdtemp(),
+                                              'checkpoint')}
+        with mock.patch('posts.thumbnails.create_thumbnail',
+                        create_in_worker):
+            call_command('regenerate_thumbnails', **options)
+        self.assertEqual('', options['stderr'].getvalue())
+        self.assertIn('generated 1', options['stdout'].getvalue())
+        self.assertIsNotNone(thumbnails.find_thumbnail(post.image))
+
+
+class TestReplicaSync(TransactionTestCase):
+
+    def tearDown(self):
+        cache.clear()
+
+    @override_settings(REPLICA_DATABASES=['replica1'])
+    def test_sync_replicas(self):
+        author = User.objects.create(username='replicated')
+        Post.objects.create(text='replicated', author=author)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            with mock.patch.dict(connections.databases,
+                                 {'replica1': {'NAME': path}}):
+                call_command('sync_replicas', stdout=StringIO())
+            copy = sqlite3.connect(path)
+            count = copy.execute('SELECT COUNT(*) FROM posts_post')
+            self.assertEqual(1, count.fetchone()[0])
+            copy.close()
+        generation, synced_at = cache.get(sync_key('replica1'))
+        self.assertEqual(feed_generation(), generation)
+        self.assertLess(time.time() - synced_at, settings.REPLICA_MAX_LAG)
+
+
+# the writer thread only sees committed rows
+class TestWriter(TransactionTestCase):
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_concurrent_writes_are_batched(self):
+        author = User.objects.create(username='written')
+        post = Post.objects.create(text='written', author=author)
+        commenters = [User.objects.create(username=f'commenter{i}')
+                      for i in range(20)]
+        batches = []
+        write = writer._write
+
+        def record(batch):
+            if not batches:
+                # hold the first commit until every thread queued its first
+                # write, in this batch or behind it
+                deadline = time.monotonic() + 5
+                while (len(batch) + writer._queue.qsize() < len(commenters)
+                       and time.monotonic() < deadline):
+                    time.sleep(0.01)
+            batches.append(len(batch))
+            write(batch)
+
+        errors = []
+
+        def comment(user):
+            try:
+                writer.run(Comment.objects.create, post=post, author=user,
+                           text='written')
+                # a duplicate follow fails alone
+                writer.run(Follow.objects.create, user=user, author=author)
+                writer.run(Follow.objects.create, user=user, author=author)
+            except IntegrityError:
+                errors.append(user)
+            finally:
+                connections.close_all()
+
+        with mock.patch('posts.writer._write', record):
+            threads = [threading.Thread(target=comment, args=[user])
+                       for user in commenters]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(commenters, sorted(errors, key=commenters.index))
+        self.assertEqual(20, Comment.objects.filter(post=post).count())
+        self.assertEqual(20, Follow.objects.filter(author=author).count())
+        self.assertEqual(20, Post.objects.get(pk=post.pk).comment_count)
+        self.assertEqual(60, sum(batches))
+        self.assertGreater(max(batches), 1)
@@ -0,0 +1,175 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import api_urls, urls as posts_urls
+from posts.models import Post, Comment, Follow
+from posts.tests.base import FeedTestCase
+
+# Most queries a request to each URL name of posts/urls.py and
+# posts/api_urls.py may run with cold caches.  The count must not depend on
+# how many posts, comments or followers are involved; raise a budget only
+# for a new fixed cost.
+QUERY_BUDGETS = {
+    'index': 4,
+    'follow_index': 4,
+    'search': 6,
+    'profile': 9,
+    'post': 6,
+    'post_edit': 5,
+    'post_new': 7,
+    'group': 5,
+    'add_comment': 6,
+    'profile_follow': 11,
+    'profile_unfollow': 8,
+    'api_posts': 3,
+    'api_group_posts': 4,
+    'api_profile_posts': 4,
+    'api_follow_posts': 3,
+    'api_post': 5,
+}
+
+
+class QueryBudgetTestCase(FeedTestCase):
+    """Runs requests against ``QUERY_BUDGETS``.
+
+    ``check_budget`` fails listing every query of the request when the
+    budget is exceeded; ``check_constant`` also grows the data between two
+    requests and fails when the query count moves with it.
+    """
+
+    def count_queries(self, url_name, method, url, data=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(url, data)
+        self.assertIn(response.status_code, (200, 302), url)
+        # copied now, the next request clears the log they point into
+        return [query['sql'] for query in captured.captured_queries]
+
+    def check_budget(self, url_name, method, url, data=None):
+        queries = self.count_queries(url_name, method, url, data)
+        budget = QUERY_BUDGETS[url_name]
+        if len(queries) > budget:
+            listing = '\n'.join(f'{number}. {sql}' for number, sql
+                                in enumerate(queries, 1))
+            self.fail(f'{url_name} ({method.upper()} {url}) ran '
+                      f'{len(queries)} queries, budget {budget}:\n{listing}')
+        return queries
+
+    def check_constant(self, url_name, grow, method='get', url=None,
+                       data=None, reset=None):
+        """Compare the query counts of a request before and after ``grow``.
+
+        ``reset`` undoes the effect of a write request, so the second one
+        runs in the same state as the first.
+        """
+        url = url or reverse(url_name)
+        # rows created on first use, e.g. AuthorStats, are not per-request
+        # costs
+        self.count_queries(url_name, method, url, data)
+        if reset:
+            reset()
+        before = self.check_budget(url_name, method, url, data)
+        if reset:
+            reset()
+        grow()
+        after = self.check_budget(url_name, method, url, data)
+        if len(before) != len(after):
+            listing = '\n'.join(f'{number}. {sql}' for number, sql
+                                in enumerate(after, 1))
+            self.fail(f'{url_name} ran {len(before)} queries, then '
+                      f'{len(after)} with more data:\n{listing}')
+
+
+class TestQueryBudgets(QueryBudgetTestCase):
+    prefix = 'budget'
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.posts[0]
+        self.add_comments(1)
+
+    def add_posts(self, count):
+        first = Post.objects.count()
+        authors = [self.author] + [
+            User.objects.create(username=f'budget_writer_{first + number}')
+            for number in range(count - 1)]
+        return [Post.objects.create(text='budget post', author=author,
+                                    group=self.group) for author in authors]
+
+    def add_comments(self, count):
+        for _ in range(count):
+            commenter = User.objects.create(
+                username=f'budget_commenter_{Comment.objects.count()}')
+            Comment.objects.create(post=self.post, author=commenter,
+                                   text='budget comment')
+
+    def grow(self):
+        self.add_posts(6)
+        self.add_comments(6)
+        for post in Post.objects.exclude(author=self.author)[:3]:
+            Follow.objects.get_or_create(user=self.reader, author=post.author)
+
+    def post_url(self, name):
+        return reverse(name, kwargs={'username': self.author.username,
+                                     'post_id': self.post.pk})
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in (posts_urls.urlpatterns
+                                              + api_urls.urlpatterns)}
+        self.assertEqual(set(), names - set(QUERY_BUDGETS))
+
+    def test_feeds(self):
+        self.check_constant('index', self.grow)
+        self.check_constant('follow_index', self.grow)
+        self.check_constant('group', self.grow,
+                            url=reverse('group', args=[self.group.slug]))
+        self.check_constant('profile', self.grow,
+                            url=reverse('profile',
+                                        args=[self.author.username]))
+
+    def test_search(self):
+        self.check_constant('search', self.grow, data={'q': 'budget'})
+
+    def test_post_pages(self):
+        self.check_constant('post', self.grow, url=self.post_url('post'))
+        self.client.force_login(self.author)
+        self.check_constant('post_edit', self.grow,
+                            url=self.post_url('post_edit'))
+
+    def test_writes(self):
+        self.check_constant('add_comment', self.grow, 'post',
+                            self.post_url('add_comment'), {'text': 'more'})
+        self.check_constant('post_new', self.grow, 'post', None,
+                            {'text': 'new', 'group': self.group.pk})
+
+    def test_follow(self):
+        url = reverse('profile_follow', args=[self.author.username])
+        Follow.objects.filter(user=self.reader).delete()
+
+        def unfollow():
+            Follow.objects.filter(user=self.reader).delete()
+
+        self.check_constant('profile_follow', self.grow, url=url,
+                            reset=unfollow)
+        url = reverse('profile_unfollow', args=[self.author.username])
+
+        def follow():
+            Follow.objects.create(user=self.reader, author=self.author)
+
+        self.check_constant('profile_unfollow', self.grow, url=url,
+                            reset=follow)
+
+    def test_api(self):
+        self.check_constant('api_posts', self.grow)
+        self.check_constant('api_follow_posts', self.grow)
+        self.check_constant('api_group_posts', self.grow,
+                            url=reverse('api_group_posts',
+                                        args=[self.group.slug]))
+        self.check_constant('api_profile_posts', self.grow,
+                            url=reverse('api_profile_posts',
+                                        args=[self.author.username]))
+        self.check_constant('api_post', self.grow,
+                            url=reverse('api_post', args=[self.post.pk]))
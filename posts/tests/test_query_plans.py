@@ -0,0 +1,77 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment
+from posts.pagination import encode_cursor
+from posts.tests.base import FeedTestCase
+
+# A plan step reading a whole table: "SCAN posts_post" or, on older SQLite,
+# "SCAN TABLE posts_post".  Scans that walk an index in feed order are fine.
+FULL_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE')
+
+
+class TestFeedQueryPlans(FeedTestCase):
+    prefix = 'plan'
+    post_count = 15
+
+    def setUp(self):
+        super().setUp()
+        for post in self.posts[:3]:
+            Comment.objects.create(post=post, author=self.reader,
+                                   text='plan comment')
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def check_plans(self, url, query=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, query or {})
+        self.assertEqual(200, response.status_code)
+
+        checked = 0
+        for captured_query in captured.captured_queries:
+            sql = captured_query['sql']
+            if not sql.startswith('SELECT') or 'posts_' not in sql:
+                continue
+            checked += 1
+            for step in self.explain(sql):
+                scan = FULL_SCAN_RE.search(step)
+                self.assertFalse(
+                    scan and scan.group(1).startswith('posts_'),
+                    f'Full table scan in {url}: {step}\n{sql}')
+                self.assertIsNone(
+                    TEMP_SORT_RE.search(step),
+                    f'Temporary sort in {url}: {step}\n{sql}')
+        self.assertGreater(checked, 0, f'No feed queries captured for {url}')
+
+    def feed_urls(self):
+        return [
+            reverse('index'),
+            reverse('group', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+        ]
+
+    def test_feed_pages_use_indexes(self):
+        for url in self.feed_urls():
+            self.check_plans(url)
+            self.check_plans(url, {'page': 2})
+
+    def test_cursor_pages_use_indexes(self):
+        cursor = encode_cursor(self.posts[7])
+        for url in self.feed_urls():
+            self.check_plans(url, {'after': cursor})
+            self.check_plans(url, {'before': cursor})
+
+    def test_post_page_uses_indexes(self):
+        post = self.posts[0]
+        self.check_plans(reverse('post', kwargs={
+            'username': self.author.username, 'post_id': post.pk}))
@@ -0,0 +1,169 @@
+"""Post image thumbnails generated off the request path.
+
+Views queue a thumbnail as soon as a post with an image is saved; a small
+thread pool crops and encodes it in the background.  Until it is ready
+templates show a placeholder of the same size, so rendering a feed never
+has to open the original image.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .feed import bump_feed_generation
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_SVG = ("data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/"
+                   "svg' width='{width}' height='{height}'/%3E")
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+class Placeholder:
+    """Stands in for a thumbnail that is not generated yet."""
+    is_placeholder = True
+
+    def __init__(self, geometry):
+        self.width, self.height = (int(side) for side in geometry.split('x'))
+        self.url = PLACEHOLDER_SVG.format(width=self.width, height=self.height)
+
+
+class LookupBackend(ThumbnailBackend):
+    """sorl backend that can tell where a thumbnail would be stored."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        # the same option defaults as ThumbnailBackend.get_thumbnail, so
+        # the name matches the one sorl generates
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+lookup_backend = LookupBackend()
+
+
+def thumbnail_file(image):
+    return lookup_backend.thumbnail_file(
+        image, settings.POST_THUMBNAIL_GEOMETRY,
+        **settings.POST_THUMBNAIL_OPTIONS)
+
+
+def find_thumbnail(image):
+    """Return the ready thumbnail of ``image`` or None, never generate it."""
+    return default.kvstore.get(thumbnail_file(image))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnail')
+        return _executor
+
+
+def create_thumbnail(name):
+    """Create the thumbnail of the stored image ``name``."""
+    return get_thumbnail(name, settings.POST_THUMBNAIL_GEOMETRY,
+                         **settings.POST_THUMBNAIL_OPTIONS)
+
+
+def generate(post_id, name):
+    """Create the thumbnail of a post image and refresh cached pages."""
+    create_thumbnail(name)
+    # cached cards and feed pages still show the placeholder
+    Post.objects.filter(pk=post_id).update(version=F('version') + 1)
+    bump_feed_generation()
+
+
+def _work(post_id, name):
+    try:
+        generate(post_id, name)
+    except Exception:
+        logger.exception('Thumbnail generation failed for %s', name)
+    finally:
+        with _executor_lock:
+            _pending.discard(name)
+        # the worker thread owns its connections, don't leave them open
+        connections.close_all()
+
+
+def _submit(post_id, name):
+    with _executor_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _get_executor().submit(_work, post_id, name)
+
+
+def schedule(post):
+    """Queue the thumbnail of ``post`` once the current transaction commits."""
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: _submit(post.pk, name))
+
+
+def _get_raw_many(keys):
+    """Look ``keys`` up in sorl's key-value store with one round trip.
+
+    For the cached database store this is one cache ``get_many`` plus, for
+    keys the cache does not know, one query; like sorl itself it remembers
+    keys missing from the table so they are not queried again.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(key__in=missing)
+                      .values_list('key', 'value'))
+        fresh = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(fresh, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fresh)
+    return {key: value for key, value in values.items()
+            if value != EMPTY_VALUE}
+
+
+def prefetch_thumbnails(posts):
+    """Set ``post.thumbnail`` on every post of ``posts`` with an image.
+
+    The thumbnails of a whole page are resolved together instead of one
+    key-value store lookup per post.  Thumbnails that are not ready are
+    queued and replaced by a placeholder.
+    """
+    posts = [post for post in posts if post.image]
+    keys = [add_prefix(thumbnail_file(post.image).key) for post in posts]
+    values = _get_raw_many(keys) if keys else {}
+    for key, post in zip(keys, posts):
+        if values.get(key):
+            post.thumbnail = deserialize_image_file(values[key])
+        else:
+            # posts saved before thumbnails were queued on save catch up here
+            _submit(post.pk, post.image.name)
+            post.thumbnail = Placeholder(settings.POST_THUMBNAIL_GEOMETRY)
@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.conf import settings
+
+from .bulk import batched
+from .models import Post, Follow, TimelineEntry
+
+
+def _bulk_insert(entries):
+    for batch in batched(entries, settings.TIMELINE_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Deliver a freshly published post to every follower of its author."""
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def fan_out_many(posts):
+    """Deliver stored posts to the followers of their authors.
+
+    ``posts`` are ``(pk, author_id, pub_date)`` rows, e.g. a batch written
+    by ``bulk_create``, which sends no ``post_save``.
+    """
+    by_author = defaultdict(list)
+    for pk, author_id, pub_date in posts:
+        by_author[author_id].append((pk, pub_date))
+    followers = Follow.objects.filter(
+        author_id__in=list(by_author)).values_list('author_id', 'user_id')
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for author_id, user_id in followers.iterator()
+        for post_id, pub_date in by_author[author_id]
+    )
+
+
+def backfill(user_id, author_id):
+    """Copy all posts of ``author_id`` into the timeline of ``user_id``."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def backfill_many(follows):
+    """Copy the posts of followed authors into the followers' timelines.
+
+    ``follows`` are ``(user_id, author_id)`` pairs, e.g. a batch written by
+    ``bulk_create``.  The posts of all their authors are read in one query.
+    """
+    by_author = defaultdict(list)
+    for user_id, author_id in follows:
+        by_author[author_id].append(user_id)
+    posts = Post.objects.filter(author_id__in=list(by_author)).order_by(
+    ).values_list('author_id', 'pk', 'pub_date')
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for author_id, post_id, pub_date in posts.iterator()
+        for user_id in by_author[author_id]
+    )
+
+
+def prune(user_id, author_id):
+    """Drop the posts of ``author_id`` from the timeline of ``user_id``."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
@@ -1,45 +1,92 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
-from django.http import HttpResponseNotFound
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.middleware.csrf import get_token
 from django.shortcuts import render, redirect, get_object_or_404
+from django.views.decorators.http import condition
 
+from yatube.routers import read_from_replica
 from yatube.settings import TEMPLATE_CACHE_TIMEOUTS
-from .models import Post, Follow
-from .forms import PostForm, CommentForm
+from .models import Post, Group, Follow, TimelineEntry
+from . import search, thumbnails, writer
+from .forms import PostForm, CommentForm, SearchForm
+from .feed import feed_etag, feed_generation
+from .pagination import deep_page_redirect, paginate, uncounted_page
+from .stats import get_author_stats
 
 User = get_user_model()
 
 
+def _index_etag(request):
+    return feed_etag(request)
+
+
+def _group_etag(request, slug):
+    return feed_etag(request, slug)
+
+
+def _profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return None
+    following = request.user.is_authenticated and Follow.objects.filter(
+        author=author_id, user=request.user.pk).exists()
+    return feed_etag(request, author_id, following,
+                     *get_author_stats(author_id).values())
+
+
+def _post_etag(request, username, post_id):
+    post = Post.objects.filter(
+        author__username=username, pk=post_id).order_by().values_list(
+        'author_id', 'version')[:1]
+    if not post:
+        return None
+    author_id, version = post[0]
+    csrf_secret = None
+    if request.user.is_authenticated:
+        # the comment form carries a token of the viewer's CSRF secret,
+        # which is rotated on login; get_token() masks it anew every call
+        get_token(request)
+        csrf_secret = request.META['CSRF_COOKIE']
+    return feed_etag(request, post_id, version, csrf_secret,
+                     *get_author_stats(author_id).values())
+
+
+@read_from_replica
+@condition(etag_func=_index_etag)
 def index(request):
     posts = Post.objects.select_related('author', 'group').all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page', 1)
-    page = paginator.get_page(page_number)
+    deep_page = deep_page_redirect(request, posts)
+    if deep_page:
+        return deep_page
     return render(
         request, 'index.html',
         {
-            'page': page,
-            'paginator': paginator,
-            'cache_timeout': TEMPLATE_CACHE_TIMEOUTS['index']
+            **paginate(request, posts),
+            'cache_timeout': TEMPLATE_CACHE_TIMEOUTS['index'],
+            'feed_generation': feed_generation(),
         })
 
 
+@read_from_replica
+@condition(etag_func=_group_etag)
 def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
     posts = Post.objects.select_related('author', 'group').filter(
-        group__slug=slug)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page', 1)
-    page = paginator.get_page(page_number)
-    if posts:
-        group = posts[0].group
-        return render(request, 'group.html',
-                      {'group': group, 'page': page, 'paginator': paginator})
-    else:
-        return HttpResponseNotFound(request)
+        group=group)
+    deep_page = deep_page_redirect(request, posts)
+    if deep_page:
+        return deep_page
+    return render(request, 'group.html',
+                  {'group': group, **paginate(request, posts),
+                   'cache_timeout': TEMPLATE_CACHE_TIMEOUTS['group'],
+                   'feed_generation': feed_generation()})
 
 
+@read_from_replica
+@condition(etag_func=_profile_etag)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     try:
@@ -47,15 +94,20 @@ def profile(request, username):
     except Follow.DoesNotExist:
         following = None
     posts = author.posts.select_related('author', 'group').all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page', 1)
-    page = paginator.get_page(page_number)
+    deep_page = deep_page_redirect(request, posts)
+    if deep_page:
+        return deep_page
     return render(request, 'profile.html',
                   {'author': author, 'posts': posts,
-                   'page': page, 'paginator': paginator,
-                   'following': following})
+                   **paginate(request, posts),
+                   'stats': get_author_stats(author.pk),
+                   'following': following,
+                   'cache_timeout': TEMPLATE_CACHE_TIMEOUTS['profile'],
+                   'feed_generation': feed_generation()})
 
 
+@read_from_replica
+@condition(etag_func=_post_etag)
 def post_view(request, username: str, post_id: int):
     post = get_object_or_404(
         Post.objects.select_related('author', 'group'),
@@ -64,18 +116,46 @@ def post_view(request, username: str, post_id: int):
     comment_form = CommentForm()
 
     author = post.author
-    comments = post.comments.all()
-    post_count = author.posts.count()
+    comments = post.comments.select_related('author')
 
     return render(request, 'post.html',
                   {
                       'author': author, 'post': post,
-                      'post_count': post_count,
+                      'stats': get_author_stats(author.pk),
                       'comments': comments,
                       'form': comment_form,
                   })
 
 
+def post_search(request):
+    form = SearchForm(request.GET)
+    page = None
+    match = form.is_valid() and search.match_expression(
+        form.cleaned_data['q'])
+    if match:
+        posts = Post.objects.select_related('author', 'group')
+        if form.cleaned_data['group']:
+            posts = posts.filter(group=form.cleaned_data['group'])
+        if form.cleaned_data['author']:
+            posts = posts.filter(
+                author__username=form.cleaned_data['author'])
+        try:
+            number = int(request.GET.get('page', 1))
+        except ValueError:
+            number = 1
+        # ranking deep pages costs as much as ranking everything
+        number = min(max(number, 1), settings.FEED_PAGE_NUMBER_LIMIT)
+        page = uncounted_page(search.search_posts(posts, match), number)
+        for post in page:
+            post.highlighted = search.highlight(post.snippet)
+    query = request.GET.copy()
+    query.pop('page', None)
+    return render(request, 'search.html',
+                  {'form': form, 'page': page,
+                   'query_string': query.urlencode(),
+                   'page_limit': settings.FEED_PAGE_NUMBER_LIMIT})
+
+
 @login_required
 def post_new(request):
     form = PostForm(request.POST, request.FILES or None)
@@ -83,6 +163,7 @@ def post_new(request):
         new_post = form.save(commit=False)
         new_post.author = request.user
         new_post.save()
+        thumbnails.schedule(new_post)
         redirect_to = reverse('index')
         return redirect(redirect_to)
     else:
@@ -103,7 +184,9 @@ def post_edit(request, username, post_id):
                     instance=post)
     if request.method == 'POST':
         if form.is_valid():
-            form.save(commit=True)
+            post = form.save(commit=True)
+            if 'image' in form.changed_data:
+                thumbnails.schedule(post)
             return redirect(
                 reverse('post',
                         kwargs=dict(username=username, post_id=post_id)))
@@ -139,22 +222,28 @@ def add_comment(request, username: str, post_id: int):
             comment = form.save(commit=False)
             comment.author = request.user
             comment.post = post
-            comment.save()
+            writer.run(comment.save)
     return redirect(redirect_to)
 
 
+def _entry_posts(entries):
+    return [entry.post for entry in entries]
+
+
+@read_from_replica
 @login_required
 def follow_index(request):
-    following_posts = Post.objects.select_related('author').filter(
-        author__following__user=request.user)
-    paginator = Paginator(following_posts, 10)
-    page_number = request.GET.get('page', 1)
-    page = paginator.get_page(page_number)
+    entries = TimelineEntry.objects.select_related(
+        'post__author', 'post__group').filter(
+        user=request.user).order_by('-pub_date', '-post_id')
+    deep_page = deep_page_redirect(request, entries, id_field='post_id')
+    if deep_page:
+        return deep_page
     return render(
         request, 'follow.html',
         {
-            'page': page,
-            'paginator': paginator,
+            **paginate(request, entries, id_field='post_id',
+                       transform=_entry_posts),
             'cache_timeout': TEMPLATE_CACHE_TIMEOUTS['index'],
         }
     )
@@ -164,7 +253,8 @@ def follow_index(request):
 def profile_follow(request, username):
     if username != request.user.username:
         author = get_object_or_404(User, username=username)
-        Follow.objects.get_or_create(user=request.user, author=author)
+        writer.run(Follow.objects.get_or_create, user=request.user,
+                   author=author)
     redirect_to = reverse('follow_index')
     return redirect(redirect_to)
 
@@ -172,5 +262,6 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(author=author.pk, user=request.user.pk).delete()
+    writer.run(Follow.objects.filter(author=author.pk,
+                                     user=request.user.pk).delete)
     return redirect(reverse('index'))
@@ -0,0 +1,103 @@
+"""Comment and follow writes funnelled through one writer thread.
+
+SQLite lets one connection write at a time.  When every request thread
+writes on its own connection, they queue on the database lock with a
+sleep-and-retry busy handler and give up with "database is locked" under
+load.  ``run`` hands the write to a single thread of the process instead:
+it takes whatever writes are waiting, up to ``WRITE_BATCH_SIZE``, and
+commits them in one transaction.  It never waits for more, a lone write is
+committed at once; under load the writes queued during one commit make
+up the next batch.  Every write runs in its own savepoint, so a failing
+one is rolled back alone and its exception is raised in the request that
+asked for it; the others still commit.  Requests wait until their write
+is committed, so the page they redirect to shows it.
+
+Writes made while a transaction is open (``ATOMIC_REQUESTS``, tests) run
+inline: the writer's connection could not see the rows of that
+transaction.  ``WRITE_QUEUE = False`` runs every write inline.
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_queue = None
+_pid = None
+
+
+def _collect(jobs):
+    """Wait for the next write, return it with the ones queued behind."""
+    batch = [jobs.get()]
+    while len(batch) < settings.WRITE_BATCH_SIZE:
+        try:
+            batch.append(jobs.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write(batch):
+    results = []
+    try:
+        with transaction.atomic():
+            for future, func, args, kwargs in batch:
+                try:
+                    with transaction.atomic():
+                        results.append((future, func(*args, **kwargs), None))
+                except Exception as error:
+                    results.append((future, None, error))
+    except Exception as error:
+        # the commit failed, none of the batch was written
+        for future, *_ in batch:
+            future.set_exception(error)
+        return
+    for future, result, error in results:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+def _work(jobs):
+    while True:
+        batch = _collect(jobs)
+        try:
+            _write(batch)
+        except Exception:
+            logger.exception('Write batch failed')
+        finally:
+            # drops the connection if it broke or outlived CONN_MAX_AGE
+            close_old_connections()
+
+
+def _get_queue():
+    global _queue, _pid
+    with _lock:
+        # a forked worker process inherits the queue but not the thread
+        if _queue is None or _pid != os.getpid():
+            _queue, _pid = queue.SimpleQueue(), os.getpid()
+            threading.Thread(target=_work, args=(_queue,), name='writer',
+                             daemon=True).start()
+        return _queue
+
+
+def run(func, *args, **kwargs):
+    """Call ``func(*args, **kwargs)`` in the writer thread, return its result.
+
+    Exceptions of ``func`` are raised here.  Waits at most
+    ``WRITE_QUEUE_TIMEOUT`` seconds; the write may still be committed
+    after a timeout.
+    """
+    if (not settings.WRITE_QUEUE
+            or transaction.get_connection().in_atomic_block):
+        return func(*args, **kwargs)
+    future = Future()
+    _get_queue().put((future, func, args, kwargs))
+    return future.result(timeout=settings.WRITE_QUEUE_TIMEOUT)
@@ -1,3 +1,4 @@
+from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
 
@@ -5,7 +6,19 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
+# first path segments taken by other pages, a profile under one of them
+# could never be reached, see yatube/urls.py and posts/urls.py
+RESERVED_USERNAMES = ('about', 'about-author', 'about-spec', 'admin', 'api',
+                      'auth', 'follow', 'group', 'new', 'search')
+
+
 class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        if username in RESERVED_USERNAMES:
+            raise forms.ValidationError('Это имя пользователя занято.')
+        return username
@@ -0,0 +1,325 @@
+"""Cache backend shared by all worker processes on one host.
+
+Entries live in a SQLite database in WAL mode, so readers in any number of
+processes never block each other and a single writer only briefly blocks
+other writers.  The cache is bounded by entry count (``MAX_ENTRIES``) and
+by total pickled size (``MAX_SIZE``); when either limit is exceeded the
+least recently used entries are evicted.
+
+Recency is tracked with a resolution of ``ACCESS_RESOLUTION`` seconds:
+a hit only writes back its access time when the stored one is older than
+that, which keeps the read path free of writes for hot keys.
+
+Example::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache.SQLiteCache',
+            'LOCATION': '/var/cache/yatube/cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 256 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from yatube.profiling import record_cache
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cache_entry (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    'CREATE INDEX IF NOT EXISTS cache_entry_accessed '
+    'ON cache_entry (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_entry_expires '
+    'ON cache_entry (expires) WHERE expires IS NOT NULL',
+    # entry count and total size, maintained by triggers so the limits can
+    # be checked without scanning the table
+    """
+    CREATE TABLE IF NOT EXISTS cache_usage (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        entries INTEGER NOT NULL,
+        size INTEGER NOT NULL
+    )
+    """,
+    'INSERT OR IGNORE INTO cache_usage (id, entries, size) VALUES (0, 0, 0)',
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_entry_insert
+    AFTER INSERT ON cache_entry BEGIN
+        UPDATE cache_usage SET entries = entries + 1, size = size + NEW.size;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_entry_update
+    AFTER UPDATE OF size ON cache_entry BEGIN
+        UPDATE cache_usage SET size = size - OLD.size + NEW.size;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_entry_delete
+    AFTER DELETE ON cache_entry BEGIN
+        UPDATE cache_usage SET entries = entries - 1, size = size - OLD.size;
+    END
+    """,
+)
+
+# keep IN (...) lists under SQLite's default host parameter limit
+MAX_PARAMS = 500
+
+
+class _transaction:
+    """``BEGIN IMMEDIATE`` ... ``COMMIT`` on an autocommit connection."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 2 ** 20))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._access_resolution = float(
+            options.get('ACCESS_RESOLUTION', 60))
+        self._local = threading.local()
+
+    # connections
+
+    @property
+    def _db(self):
+        # one connection per thread and process, sqlite3 connections must
+        # not cross either boundary
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = self._connect()
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                             isolation_level=None)
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+        with _transaction(db):
+            for statement in SCHEMA:
+                db.execute(statement)
+        return db
+
+    def close(self, **kwargs):
+        # Django calls this at the end of every request; the connection is
+        # cheap to keep and expensive to reopen, so only drop it on fork
+        pass
+
+    # helpers
+
+    def _expiry(self, timeout):
+        # an absolute timestamp, or None for entries that never expire
+        return self.get_backend_timeout(timeout)
+
+    def _dump(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _fetch(self, db, keys, now):
+        """Return {key: (value, accessed)} for the live entries of ``keys``."""
+        found = {}
+        for start in range(0, len(keys), MAX_PARAMS):
+            chunk = keys[start:start + MAX_PARAMS]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = db.execute(
+                f'SELECT key, value, accessed FROM cache_entry '
+                f'WHERE key IN ({placeholders}) '
+                f'AND (expires IS NULL OR expires > ?)',
+                (*chunk, now))
+            for key, value, accessed in rows:
+                found[key] = (value, accessed)
+        return found
+
+    def _touch_accessed(self, db, found, now):
+        stale = [key for key, (_, accessed) in found.items()
+                 if now - accessed > self._access_resolution]
+        if stale:
+            with _transaction(db):
+                db.executemany(
+                    'UPDATE cache_entry SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in stale])
+
+    def _store(self, db, key, value, timeout, now, only_new=False):
+        data = self._dump(value)
+        params = (key, data, len(data), self._expiry(timeout), now)
+        if only_new:
+            # an expired entry counts as missing
+            db.execute(
+                'DELETE FROM cache_entry WHERE key = ? AND expires <= ?',
+                (key, now))
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO cache_entry '
+                '(key, value, size, expires, accessed) '
+                'VALUES (?, ?, ?, ?, ?)', params)
+            return cursor.rowcount == 1
+        db.execute(
+            'INSERT INTO cache_entry (key, value, size, expires, accessed) '
+            'VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'size = excluded.size, expires = excluded.expires, '
+            'accessed = excluded.accessed', params)
+        return True
+
+    def _cull(self, db, now):
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_usage').fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        db.execute('DELETE FROM cache_entry WHERE expires <= ?', (now,))
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_usage').fetchone()
+        if entries > self._max_entries:
+            # same policy as Django's backends: drop 1/CULL_FREQUENCY of
+            # the entries, here the least recently used ones
+            count = (entries // self._cull_frequency
+                     if self._cull_frequency else entries)
+            db.execute(
+                'DELETE FROM cache_entry WHERE key IN (SELECT key '
+                'FROM cache_entry ORDER BY accessed LIMIT ?)',
+                (max(count, entries - self._max_entries),))
+        while size > self._max_size:
+            # evict LRU entries until the size limit holds, in chunks
+            db.execute(
+                'DELETE FROM cache_entry WHERE key IN (SELECT key '
+                'FROM cache_entry ORDER BY accessed LIMIT ?)',
+                (MAX_PARAMS,))
+            size = db.execute('SELECT size FROM cache_usage').fetchone()[0]
+
+    # BaseCache API
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db, now = self._db, time.time()
+        with _transaction(db):
+            added = self._store(db, key, value, timeout, now, only_new=True)
+            if added:
+                self._cull(db, now)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db, now = self._db, time.time()
+        found = self._fetch(db, [key], now)
+        if key not in found:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        self._touch_accessed(db, found, now)
+        return pickle.loads(found[key][0])
+
+    def get_many(self, keys, version=None):
+        key_map = {}
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            key_map[cache_key] = key
+        if not key_map:
+            return {}
+        db, now = self._db, time.time()
+        found = self._fetch(db, list(key_map), now)
+        record_cache(len(found), len(key_map) - len(found))
+        self._touch_accessed(db, found, now)
+        return {key_map[key]: pickle.loads(value)
+                for key, (value, _) in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db, now = self._db, time.time()
+        with _transaction(db):
+            self._store(db, key, value, timeout, now)
+            self._cull(db, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        db, now = self._db, time.time()
+        with _transaction(db):
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                self.validate_key(key)
+                self._store(db, key, value, timeout, now)
+            self._cull(db, now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db, now = self._db, time.time()
+        with _transaction(db):
+            cursor = db.execute(
+                'UPDATE cache_entry SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self._expiry(timeout), now, key, now))
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db, now = self._db, time.time()
+        # the write lock taken up front makes read-modify-write atomic
+        # across processes
+        with _transaction(db):
+            found = self._fetch(db, [key], now)
+            if key not in found:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(found[key][0]) + delta
+            data = self._dump(value)
+            db.execute(
+                'UPDATE cache_entry SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?', (data, len(data), now, key))
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key in self._fetch(self._db, [key], time.time())
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self._db
+        with _transaction(db):
+            db.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        db = self._db
+        with _transaction(db):
+            db.executemany('DELETE FROM cache_entry WHERE key = ?',
+                           [(key,) for key in keys])
+
+    def clear(self):
+        db = self._db
+        with _transaction(db):
+            db.execute('DELETE FROM cache_entry')
@@ -0,0 +1,219 @@
+"""Per-request timings cheap enough to keep on in production.
+
+``ProfilingMiddleware`` measures every request: total time, time and number
+of SQL queries, template rendering time and cache hits and misses.  They
+are sent back in a ``Server-Timing`` header, which browser developer tools
+show next to the request, and a sample of the requests is written as one
+JSON object per line to the ``yatube.requests`` logger::
+
+    {"time": "2020-05-01T12:00:00.000000+00:00", "method": "GET",
+     "path": "/", "view": "index", "status": 200, "total_ms": 23.1,
+     "sql_ms": 4.2, "queries": 4, "template_ms": 12.5,
+     "cache_hits": 3, "cache_misses": 1}
+
+``REQUEST_LOG_SAMPLE_RATE`` is the share of requests logged; requests
+slower than ``REQUEST_LOG_SLOW_MS`` are always logged.
+
+Queries slower than ``SLOW_QUERY_MS`` are written to the
+``yatube.slow_queries`` logger, ``SLOW_QUERY_SAMPLE_RATE`` of them, with
+their parameters, the view that ran them and their query plan::
+
+    {"time": "...", "fingerprint": "SELECT ... WHERE \"id\" IN (...)",
+     "sql": "...", "params": [1, 2], "duration_ms": 312.4,
+     "view": "index", "path": "/", "plan": ["SCAN posts_post"]}
+
+``python manage.py slow_query_report`` aggregates them by fingerprint.
+
+SQL time is collected with ``connection.execute_wrapper``, template time
+by the ``ProfiledDjangoTemplates`` backend and cache hits by
+``yatube.cache.SQLiteCache``.  Template time includes the queries run
+while rendering, queries are counted in both.
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('yatube.requests')
+slow_query_logger = logging.getLogger('yatube.slow_queries')
+
+# logged parameters of a slow query, the rest of a long IN list is dropped
+MAX_LOGGED_PARAMS = 20
+
+# placeholder lists and literals vary between runs of the same query
+IN_LIST_RE = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+_local = threading.local()
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 1)
+
+
+def fingerprint(sql):
+    """Return ``sql`` with literals and placeholder lists collapsed."""
+    sql = STRING_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('(...)', sql)
+    return NUMBER_RE.sub('?', sql)
+
+
+class RequestProfile:
+    __slots__ = ('request', 'sql_time', 'queries', 'template_time',
+                 'template_depth', 'cache_hits', 'cache_misses',
+                 'explaining')
+
+    def __init__(self, request):
+        self.request = request
+        self.explaining = False
+        self.sql_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sql_time += elapsed
+            self.queries += 1
+        if (elapsed * 1000 >= settings.SLOW_QUERY_MS
+                and random.random() < settings.SLOW_QUERY_SAMPLE_RATE):
+            self.log_slow_query(context['connection'], sql, params, many,
+                                elapsed)
+        return result
+
+    def explain(self, connection, sql, params):
+        prefix = connection.ops.explain_query_prefix()
+        self.explaining = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}', params)
+                # SQLite rows are (id, parent, notused, detail)
+                return [str(row[-1]) for row in cursor.fetchall()]
+        except (DatabaseError, NotImplementedError):
+            return None
+        finally:
+            self.explaining = False
+
+    def log_slow_query(self, connection, sql, params, many, elapsed):
+        plan = None
+        statement = sql.lstrip()[:6].upper()
+        if not many and statement in ('SELECT', 'UPDATE', 'DELETE'):
+            plan = self.explain(connection, sql, params)
+        if many:
+            # the parameters of the first row only
+            params = next(iter(params), ())
+        params = list(params or ())
+        match = self.request.resolver_match
+        slow_query_logger.warning(json.dumps({
+            'time': datetime.now(timezone.utc).isoformat(),
+            'fingerprint': fingerprint(sql),
+            'sql': sql,
+            'params': params[:MAX_LOGGED_PARAMS],
+            'duration_ms': _milliseconds(elapsed),
+            'view': match.view_name if match else None,
+            'path': self.request.path,
+            'plan': plan,
+        }, default=str))
+
+
+def current_profile():
+    """Return the profile of the request being handled, if any."""
+    return getattr(_local, 'profile', None)
+
+
+def record_cache(hits, misses):
+    profile = current_profile()
+    if profile is not None:
+        profile.cache_hits += hits
+        profile.cache_misses += misses
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current_profile()
+        if profile is None:
+            return super().render(context, request)
+        # templates rendered by template tags are part of the outer one
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - started
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every render."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(
+            super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(
+            super().get_template(template_name).template, self)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile(request)
+        _local.profile = profile
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = ', '.join((
+            f'total;dur={_milliseconds(total)}',
+            f'sql;dur={_milliseconds(profile.sql_time)};'
+            f'desc="{profile.queries} queries"',
+            f'tpl;dur={_milliseconds(profile.template_time)}',
+            f'cache;desc="{profile.cache_hits} hits, '
+            f'{profile.cache_misses} misses"',
+        ))
+
+        if (random.random() < settings.REQUEST_LOG_SAMPLE_RATE
+                or total * 1000 >= settings.REQUEST_LOG_SLOW_MS):
+            match = request.resolver_match
+            logger.info(json.dumps({
+                'time': datetime.now(timezone.utc).isoformat(),
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'total_ms': _milliseconds(total),
+                'sql_ms': _milliseconds(profile.sql_time),
+                'queries': profile.queries,
+                'template_ms': _milliseconds(profile.template_time),
+                'cache_hits': profile.cache_hits,
+                'cache_misses': profile.cache_misses,
+            }))
+        return response
@@ -0,0 +1,124 @@
+"""Read-only views served from replica databases.
+
+Replicas are copies of the default database made by ``manage.py
+sync_replicas``, listed in ``REPLICA_DATABASES``.  Views wrapped in
+``read_from_replica`` read from one of them; everything else, and every
+write, uses the default database.
+
+A replica is used for ``REPLICA_MAX_LAG`` seconds after it was last
+copied, so the public pages may lag the writes by that much.
+``sync_replicas`` also records the feed generation it copied, and pages
+read from a replica are cached and tagged under that generation instead of
+the current one: a fragment rendered from a replica is never served for a
+newer generation, nor one from the default database for an older one.
+
+After a write (any request that is not GET or HEAD),
+``PrimaryPinningMiddleware`` sets a cookie that keeps the client's reads on
+the default database for ``REPLICA_PIN_SECONDS``, so users see their own
+follows and edits right away even while the replicas lag.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'primary_pin'
+
+# Read from the default database in any case: sessions are written by
+# almost every login, author stats are copied into the cache on read.
+PRIMARY_MODELS = {'sessions.session', 'posts.authorstats'}
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+def sync_key(alias):
+    return f'replica_sync:{alias}'
+
+
+def record_sync(alias, generation, synced_at):
+    """Remember that ``alias`` holds at least feed ``generation``.
+
+    ``synced_at`` is when the copy started, the replica is at least as new.
+    """
+    cache.set(sync_key(alias), (generation, synced_at), None)
+
+
+def fresh_replicas():
+    """Map each replica synced within ``REPLICA_MAX_LAG`` to its generation."""
+    if not settings.REPLICA_DATABASES:
+        return {}
+    synced = cache.get_many([sync_key(alias)
+                             for alias in settings.REPLICA_DATABASES])
+    oldest = time.time() - settings.REPLICA_MAX_LAG
+    fresh = {}
+    for alias in settings.REPLICA_DATABASES:
+        state = synced.get(sync_key(alias))
+        if state is not None and state[1] >= oldest:
+            fresh[alias] = state[0]
+    return fresh
+
+
+def replica_generation():
+    """Return the feed generation of the replica this thread reads from.
+
+    None while reading from the default database.
+    """
+    return getattr(_local, 'generation', None)
+
+
+def read_from_replica(view):
+    """Run a read-only view against a fresh replica when there is one."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in SAFE_METHODS
+                or PIN_COOKIE in request.COOKIES):
+            return view(request, *args, **kwargs)
+        replicas = fresh_replicas()
+        if not replicas:
+            return view(request, *args, **kwargs)
+        _local.replica = random.choice(list(replicas))
+        _local.generation = replicas[_local.replica]
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.replica = _local.generation = None
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = getattr(_local, 'replica', None)
+        if replica is None or model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema with the data from sync_replicas
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (settings.REPLICA_DATABASES
+                and request.method not in SAFE_METHODS):
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -51,7 +51,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its total covers the other middleware too
+    'yatube.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'yatube.routers.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -66,7 +69,8 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for yatube.profiling
+        'BACKEND': 'yatube.profiling.ProfiledDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,13 +90,54 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# django.db.backends.sqlite3 with pragmas run on every connection, see
+# yatube/sqlite/base.py
+SQLITE_PRAGMAS = {
+    # readers never wait for the writer and the writer for readers
+    'journal_mode': 'WAL',
+    # in WAL mode only a power loss can drop the last commits, never
+    # corrupt the database
+    'synchronous': 'NORMAL',
+    # wait this many milliseconds for the write lock instead of failing
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 2 ** 20,
+    # negative: in KiB
+    'cache_size': -32 * 2 ** 10,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # connections are kept open across requests, each one costs a file
+        # open, the pragmas and the schema read of its first query
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+        'OPTIONS': {
+            'pragmas': SQLITE_PRAGMAS,
+            'immediate_transactions': True,
+        },
     }
 }
 
+# Read replicas, copies of the default database refreshed by
+# "manage.py sync_replicas", e.g.
+# DB_REPLICAS=/var/lib/yatube/replica1.sqlite3,/var/lib/yatube/replica2.sqlite3
+# Views wrapped in yatube.routers.read_from_replica read from them.
+REPLICA_DATABASES = []
+for number, path in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'NAME': path,
+                                     'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['yatube.routers.ReplicaRouter']
+# a replica is read for this long after "manage.py sync_replicas" copied it,
+# run the command more often than that
+REPLICA_MAX_LAG = 60
+# after a write, the client reads from the default database this long
+REPLICA_PIN_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -154,29 +199,105 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 SITE_ID = 1
 
+# JSON lines written by yatube.profiling.ProfilingMiddleware
+REQUEST_LOG = os.getenv('REQUEST_LOG',
+                        os.path.join(BASE_DIR, 'request_log.jsonl'))
+# share of requests logged, requests slower than REQUEST_LOG_SLOW_MS always
+# are
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv('REQUEST_LOG_SAMPLE_RATE', 0.01))
+REQUEST_LOG_SLOW_MS = 1000
+# queries slower than this are logged with their plan, see yatube.profiling
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG',
+                           os.path.join(BASE_DIR, 'slow_queries.jsonl'))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_SAMPLE_RATE', 1))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '%(message)s',
+        },
+    },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+        'request_log': {
+            'class': 'logging.FileHandler',
+            'filename': REQUEST_LOG,
+            'formatter': 'message',
+            'delay': True,
+        },
+        'slow_query_log': {
+            'class': 'logging.FileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'formatter': 'message',
+            'delay': True,
         },
     },
     'loggers': {
-        'django.db.backends': {
-            'level': 'DEBUG',
-            'handlers': ['console'],
-        }
+        'yatube.requests': {
+            'level': 'INFO',
+            'handlers': ['request_log'],
+            'propagate': False,
+        },
+        'yatube.slow_queries': {
+            'level': 'WARNING',
+            'handlers': ['slow_query_log'],
+            'propagate': False,
+        },
     },
 }
 
+# shared by all worker processes of the host, see yatube/cache.py
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }
 
-TEMPLATE_CACHE_TIMEOUTS = {'index': 20}
+# feed fragments are keyed on the feed generation bumped by every post and
+# comment change, so the timeouts only matter for memory use
+TEMPLATE_CACHE_TIMEOUTS = {'index': 60 * 60, 'group': 60 * 60,
+                           'profile': 60 * 60}
+
+# Feeds
+FEED_PAGE_SIZE = 10
+# numbered page links stop here, deeper pages are reached with ?after= cursors
+FEED_PAGE_NUMBER_LIMIT = 10
+# full-text search ranks only the newest this many matches, see posts.search
+SEARCH_MAX_CANDIDATES = 10000
+# posts and comments per page of the JSON API, see posts.api
+API_PAGE_SIZE = 20
+# admin changelists count at most this many rows, see posts.admin
+ADMIN_COUNT_LIMIT = 10000
+# rows per INSERT when posts are fanned out to follower timelines
+TIMELINE_BATCH_SIZE = 500
+# counters are invalidated on every change, the timeout only bounds drift
+AUTHOR_STATS_CACHE_TIMEOUT = 60 * 60
+# rendered post cards are keyed on Post.version, the timeout only bounds
+# staleness of data outside the post itself (author name, group title)
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Uploaded post images are downscaled and re-encoded by posts.images
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_QUALITY = 85
+
+# Comment and follow writes are committed in batches by one thread per
+# process, see posts.writer
+WRITE_QUEUE = True
+WRITE_BATCH_SIZE = 50
+WRITE_QUEUE_TIMEOUT = 10
+
+# Post image thumbnails, generated in the background by posts.thumbnails
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+THUMBNAIL_WORKERS = 2
 
 INTERNAL_IPS = [
     "127.0.0.1",
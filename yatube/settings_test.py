@@ -0,0 +1,36 @@
+"""Settings of the test suite.
+
+Tests clear the cache freely, so they get a cache of their own in a
+temporary directory instead of the ``cache.sqlite3`` shared with the
+development server, and every run starts from an empty one.  The request
+and slow query logs go to the same directory.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES, LOGGING
+
+_tmp_dir = tempfile.mkdtemp(prefix='yatube-test-')
+atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
+
+CACHES = {
+    **CACHES,
+    'default': {**CACHES['default'],
+                'LOCATION': os.path.join(_tmp_dir, 'cache.sqlite3')},
+}
+
+REQUEST_LOG = os.path.join(_tmp_dir, 'request_log.jsonl')
+SLOW_QUERY_LOG = os.path.join(_tmp_dir, 'slow_queries.jsonl')
+LOGGING = {
+    **LOGGING,
+    'handlers': {
+        **LOGGING['handlers'],
+        'request_log': {**LOGGING['handlers']['request_log'],
+                        'filename': REQUEST_LOG},
+        'slow_query_log': {**LOGGING['handlers']['slow_query_log'],
+                           'filename': SLOW_QUERY_LOG},
+    },
+}
@@ -0,0 +1,52 @@
+"""SQLite backend with per-connection pragmas and immediate transactions.
+
+Django's ``sqlite3`` backend passes ``OPTIONS`` straight to
+``sqlite3.connect``.  This one takes two more keys out of them first:
+
+``pragmas``
+    ``{name: value}`` run as ``PRAGMA name = value`` on every new
+    connection, e.g. ``journal_mode = WAL`` so readers never wait for the
+    writer.
+``immediate_transactions``
+    start ``atomic`` blocks with ``BEGIN IMMEDIATE``.  A deferred
+    transaction that reads first and writes later cannot wait for another
+    writer, it fails at once with "database is locked"; an immediate one
+    takes the write lock up front and waits up to ``busy_timeout``.
+
+Example::
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'yatube.sqlite',
+            'NAME': 'db.sqlite3',
+            'OPTIONS': {
+                'pragmas': {'journal_mode': 'WAL', 'busy_timeout': 5000},
+                'immediate_transactions': True,
+            },
+        }
+    }
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.immediate_transactions = params.pop('immediate_transactions',
+                                                 False)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # shared-cache in-memory databases (tests) lock tables without a
+        # busy handler: BEGIN IMMEDIATE would fail instead of waiting
+        if self.immediate_transactions and not self.is_in_memory_db():
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
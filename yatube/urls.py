@@ -15,12 +15,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.contrib import flatpages
+from django.contrib.flatpages.views import flatpage
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.conf.urls import handler404, handler500
 from django.conf import settings
 from django.conf.urls.static import static
 
+from yatube.routers import read_from_replica
+
 
 handler404 = 'posts.views.page_not_found'  # noqa
 handler500 = 'posts.views.server_error'  # noqa
@@ -28,19 +30,22 @@ handler500 = 'posts.views.server_error'  # noqa
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('about/', include('django.contrib.flatpages.urls')),
+    # django.contrib.flatpages.urls, reading from the replicas
+    path('about/<path:url>', read_from_replica(flatpage),
+         name='django.contrib.flatpages.views.flatpage'),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
 ]
 
 urlpatterns += [
-    path('about-author/', flatpages.views.flatpage, {'url': '/about-author/'},
-         name='about-author'),
-    path('about-spec/', flatpages.views.flatpage, {'url': '/about-spec/'},
-         name='about-spec'),
+    path('about-author/', read_from_replica(flatpage),
+         {'url': '/about-author/'}, name='about-author'),
+    path('about-spec/', read_from_replica(flatpage),
+         {'url': '/about-spec/'}, name='about-spec'),
 ]
 
 urlpatterns += [
+    path('api/v1/', include('posts.api_urls')),
     path('', include('posts.urls')),
 ]
 